@@ -69,4 +69,42 @@ hrv = hrv_process(ecg_signal, sf = 512, window = 60, slide = 20, metrics = ['tim
 hrv = hrv_quality(hrv, r3_th = 2.2, r4_cor_th = .75)
 hrv_good = hrv[hrv['q']]
 print(f'ECG good segments: {round(100*len(hrv_good)/len(hrv),1)}%')
-plt.plot(hrv_good['dt'],hrv_good['rmssd_60s'])
\ No newline at end of file
+plt.plot(hrv_good['dt'],hrv_good['rmssd_60s'])
+# float32 processing for long recordings: cleaned signal and interpolated RR grids are kept in float32, cleaning filters
+# run in float64 chunks, beat level RR accumulations (cumsum, variance) stay in float64. Accuracy vs float64 on 10 min
+# simulated 512 Hz ECG, 60s windows, max absolute deviation: hr, meannn, artifacts 0, rmssd/sdnn/sd1/sd2 < 1e-5 ms,
+# lf/hf < 2e-4 ms^2, lfn/hfn/dfa_alpha1/r_rr < 1e-6, bsi < 2e-3, respiratory peak frequency 0 (asserted in tests/test_dtype.py)
+ecg_signal = nk.ecg_simulate(duration=1200, sampling_rate=512)
+hrv64 = hrv_process(ecg_signal, sf = 512, window = 60, slide = 30, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'])
+hrv32 = hrv_process(ecg_signal, sf = 512, window = 60, slide = 30, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'], dtype = np.float32)
+cols = [c for c in hrv64.columns if c.endswith('_60s')]
+print((hrv64[cols] - hrv32[cols]).abs().max())
+
+# local result store partitioned by user / device / day, with hourly & nightly rollups updated on each add
+from qskit.hrv import hrv_store_add, hrv_store_query, hrv_store_rollup
+store_dir = os.path.join(working_dir, 'qskit','examples','store')
+hrv = hrv_process(ecg_signal, sf = 512, window = 60, slide = 20, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'], dts = datetime.datetime(2024,1,1,23,0))
+hrv = hrv_quality(hrv, r3_th = 2.2, r4_cor_th = .75)
+hrv_store_add(store_dir, hrv, user = 'user', device = 'shimmer3')
+# nightly median RMSSD of good quality windows for last 90 days
+nightly = hrv_store_rollup(store_dir, user = 'user', device = 'shimmer3', window = 60, freq = 'nightly', start = datetime.datetime(2024,1,2) - datetime.timedelta(days = 90))
+print(nightly[['dt','windows_q','rmssd_60s_median']])
+hrv_good = hrv_store_query(store_dir, user = 'user', device = 'shimmer3', window = 60, start = datetime.datetime(2024,1,1,23,0), end = datetime.datetime(2024,1,2,1,0), quality = True)
+
+# high rate ECG (e.g. 1000-3000 Hz): QRS detection on cleaned signal decimated to detect_sf,
+# R-peaks refined to sub-sample precision on full rate signal. On simulated 1000-3000 Hz ECG
+# refined peaks match full rate detection, max RR deviation < 1 ms
+ecg_signal = nk.ecg_simulate(duration=600, sampling_rate=3000)
+hrv = hrv_process(ecg_signal, sf = 3000, window = 60, slide = 30, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'], detect_sf = 250)
+
+# multi-channel ECG (channels x samples): leads are cleaned at once, R-peaks detected once per lead,
+# in each window the best lead is selected by beats template correlation (lead column) and
+# beats are fused by cross-lead voting, so artifacts of a single lead are dropped. Metrics are computed once on fused beats
+ecg_data = pd.read_csv(os.path.join('qskit','data','ecg','Shimmer3_ECG_Calibrated.csv'))
+ecg_leads = ecg_data[['EXG_ADS1292R_1_CH1_24BIT','EXG_ADS1292R_1_CH2_24BIT']].to_numpy().T
+hrv = hrv_process(ecg_leads, sf = 512, window = 60, slide = 30, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'])
+print(hrv['lead'].value_counts())
+
+# sample, approximate and multiscale entropy of RR intervals, computed only when requested by name in metrics
+hrv = hrv_process(ecg_signal, sf = 3000, window = 300, slide = 60, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr','sampen','apen','mse'], detect_sf = 250)
+print(hrv[['sampen_300s','apen_300s','mse_300s']].describe())
@@ -0,0 +1,60 @@
+import pandas as pd
+import numpy as np
+import asyncio
+import os
+import sys
+import logging
+
+logging.basicConfig(handlers=[
+                        # logging.FileHandler(logging_file),
+                        logging.StreamHandler(sys.stdout)
+                    ],
+                    format='%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
+                    datefmt='%H:%M:%S',
+                    level=logging.INFO)
+# put repository dir here
+working_dir = '/path/to/qs-kit'
+# HrvHub runs hrv_process in worker processes, which re-import this script on spawn platforms (macOS, Windows),
+# so everything besides imports and definitions runs under the __main__ guard
+if __name__ == '__main__':
+    os.chdir(working_dir)
+from qskit.live import HrvHub, replay_file, replay_socket, hrv_dataframe
+
+# replay Movesense ECG and Polar RR recordings concurrently at 60x real-time into the live hub
+# speed = 1 is real-time, speed = None feeds as fast as processing allows (load testing)
+metrics = ['time', 'freq', 'ans', 'r_rr', 'nl', 'pwr']
+async def live(speed = 60):
+    hub = HrvHub(max_workers = 4)
+    subscriber = hub.subscribe()
+    hrv_all = []
+    async def collect():
+        while True:
+            device, hrv = await subscriber.get()
+            hrv_all.append(dict(hrv, device = device))
+            print(f"{device} {hrv['dt']} hr: {round(hrv['hr_30s'])}, rmssd: {round(hrv['rmssd_30s'])}")
+    collector = asyncio.create_task(collect())
+    await asyncio.gather(
+        replay_file(hub, 'movesense', os.path.join('qskit','data','ecg','MovesenseMD_EcgActivityGraphView.csv'), 512, type = 'ECG', column = 'Count', speed = speed, window = 30, slide = 10, metrics = metrics),
+        replay_file(hub, 'polar', os.path.join('qskit','data','rr','PolarFlowExport_RR.CSV'), 1000, type = 'RR', column = 'duration', speed = speed, window = 30, slide = 10, metrics = metrics),
+        # Hypnodyne ZMax PPG EDF, replayed over local socket
+        # replay_socket('zmax', os.path.join('qskit','data','ppg','ZMAX_OXY_IR_AC.edf'), 256, type = 'PPG', channel = 'OXY_IR_AC', speed = speed, window = 30, slide = 10, metrics = metrics),
+    )
+    await hub.close()
+    collector.cancel()
+    return hrv_dataframe(hrv_all)
+
+# socket ingestion: devices connect to hub.serve() and stream json header + comma separated values lines
+async def live_socket(speed = None):
+    hub = HrvHub(max_workers = 4)
+    subscriber = hub.subscribe()
+    await hub.serve(port = 8765)
+    await replay_socket('polar', os.path.join('qskit','data','rr','PolarFlowExport_RR.CSV'), 1000, type = 'RR', column = 'duration', speed = speed, port = 8765, window = 30, slide = 10, metrics = metrics)
+    while len(hub.streams) > 0: await asyncio.sleep(1)
+    await hub.close()
+    return hrv_dataframe([hrv for device, hrv in [subscriber.get_nowait() for i in range(subscriber.qsize())]])
+
+if __name__ == '__main__':
+    hrv = asyncio.run(live(speed = 60))
+    print(hrv.groupby('device')['hr_30s'].describe())
+    hrv = asyncio.run(live_socket())
+    print(hrv['hr_30s'].describe())
@@ -31,3 +31,8 @@ hrv = hrv_quality(hrv, r3_th = 2.2, r4_cor_th = .75)
 hrv_good = hrv[hrv['artifacts_rate'] < 0.1]
 print(f'RR good segments: {round(100*len(hrv_good)/len(hrv),1)}%')
 plt.plot(hrv_good['dt'],hrv_good['hr_30s'])
+
+# Lomb-Scargle frequency metrics directly from unevenly sampled RR, without RR interpolation
+# on 60s windows LF starts at 0.04 Hz vs 0.067 Hz for Welch, compare lfn between psd_method values with care
+hrv = hrv_process(rr_data['duration'], sf = 1000, type = 'RR', window = 60, slide = 20, metrics = metrics, psd_method = 'lomb')
+plt.plot(hrv['dt'],hrv['lfn_60s'])
@@ -1,5 +1,7 @@
 from .hrv_segment import hrv_segment
 from .hrv_process import hrv_process
-from .sqi import beats_cor_sqi, peaks_sqi, hrv_quality
+from .sqi import beats_cor_sqi, beats_cor_leads, peaks_sqi, hrv_quality
 from .metrics import bsi, bsi_unbinned, rRR, ans
 from .others import _hrv_dfa
+from .nonlinear import hrv_entropy, entropy_sample, entropy_approximate, entropy_multiscale
+from .store import hrv_store_add, hrv_store_query, hrv_store_rollup, hrv_store_import, hrv_rollup
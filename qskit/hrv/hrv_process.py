@@ -5,14 +5,14 @@ import os
 import datetime
 import logging
 import neurokit2 as nk
-from vital_sqi.common.rpeak_detection import PeakDetector
 from vital_sqi.preprocess.preprocess_signal import smooth_signal,taper_signal
 from vital_sqi.common.band_filter import BandpassFilter
 from hrvanalysis import remove_ectopic_beats
 from ..misc import now, spd
-from ..signal import sc_interp1d_nan, butter_bandpass_filter
-from .sqi import peaks_sqi, beats_cor_sqi
-from .hrv_segment import hrv_segment
+from ..signal import sc_interp1d_nan, butter_bandpass_filter, ppg_findpeaks, signal_decimate, ecg_lead_peaks, ecg_clean_channels, peaks_fuse, nearest_indices
+from .sqi import peaks_sqi, beats_cor_sqi, beats_cor_leads
+from .hrv_segment import hrv_segment, psd_methods, psd_metrics
+from .lomb import hrv_lomb
 
 logger = logging.getLogger("qskit")
 logger.setLevel(logging.INFO)
@@ -26,6 +26,9 @@ def hrv_process(
         min_hr = 30, 
         max_hr = 220, 
         metrics = None,
+        psd_method = 'welch',
+        dtype = np.float64,
+        detect_sf = None,
         dts = None,
         user = 'user',
         device = 'device',
@@ -37,6 +40,18 @@ def hrv_process(
     if type not in accepted :
         logger.warning(f'wrong type selected, must be one of {accepted}')
         return None
+    if psd_method not in psd_methods:
+        logger.warning(f'wrong psd_method selected, must be one of {psd_methods}')
+        return None
+    # multi-channel ECG (channels x samples, e.g. several Shimmer3 leads) is processed in one run
+    channels = np.ndim(signal) == 2
+    if channels and type != 'ECG':
+        logger.warning('multi-channel signal is supported only for ECG')
+        return None
+    if channels and np.shape(signal)[0] > np.shape(signal)[1]:
+        # samples x channels (e.g. df[[ch1, ch2]].to_numpy()), recordings have more samples than leads
+        logger.warning(f'signal of shape {np.shape(signal)} is taken as samples x channels and transposed')
+        signal = np.asarray(signal).T
     if dts is None: dts = datetime.datetime.now()
     hrv_cache_tag = f'hrv_p{window}_s{slide}'; 
     # sliding window in samples
@@ -50,22 +65,54 @@ def hrv_process(
         rpeaks_all = np.cumsum(np.append(0, signal))
         signal = np.arange(0, rpeaks_all[-1] + 1)
     segment_len = (window * sf - 1)
-    signal_start = 0; signal_end = int(sf) * math.floor(len(signal) / sf);
+    signal_start = 0; signal_end = int(sf) * math.floor(np.shape(signal)[-1] / sf);
     # define at each progress percentage to append results into cache file and print
     progress_percent_step = 5; progress_step = s_slide*round(signal_end/((100/progress_percent_step)*s_slide))
     if progress_step == 0: progress_step = window * sf * 60
 
+    # dtype = np.float32 keeps cleaned signal and interpolated RR grids in float32, cleaning filters run in float64 chunks
+    # written into float32 output, so no full length float64 copy of the signal is made besides the caller's input.
+    # beat level RR and metrics are still computed in float64
+    dtype_clean = None if np.dtype(dtype) == np.float64 else dtype
     # clean signal
     if type == 'ECG':
-        signal_clean = nk.ecg_clean(signal, sf, method = 'neurokit')
+        if channels or dtype_clean is not None:
+            # all leads are cleaned at once, in float64 chunks for lower precision dtype
+            signal_clean = ecg_clean_channels(signal, sf, dtype = dtype_clean)
+            if not channels: signal_clean = signal_clean[0]
+        else:
+            signal_clean = nk.ecg_clean(signal, sf, method = 'neurokit')
+        # QRS detection on cleaned signal decimated to detect_sf (e.g. 250 Hz) for high rate ECG,
+        # peaks are refined to sub-sample precision on the full rate cleaned signal
+        if detect_sf is not None and detect_sf < sf:
+            signal_detect, detect_sf = signal_decimate(signal_clean, sf, detect_sf)
+        else:
+            detect_sf = None
+        # peaks refined on full rate signal (detect_sf) or fused across leads have sub-sample positions
+        peaks_fractional = channels or detect_sf is not None
+        if channels:
+            # R-peaks of each lead are detected once over the whole recording, windows slice them with searchsorted
+            lead_peaks = [ecg_lead_peaks(signal_clean[c], sf, signal_detect[c] if detect_sf is not None else None, detect_sf)
+                          for c in range(len(signal_clean))]
+        elif detect_sf is not None:
+            # decimated detection runs once over the whole recording, windows slice refined peaks with searchsorted
+            ecg_peaks = ecg_lead_peaks(signal_clean, sf, signal_detect, detect_sf)
     elif type == 'PPG':
         # https://www.mdpi.com/2073-8994/14/6/1139
         # The ECG and the PPG bandpass filters were set to 
         # 0.5 to 35 Hz [62,63] and 0.4 to 4 Hz, respectively
-        signal_clean = butter_bandpass_filter(signal, .4, 4, sf, 4)
+        signal_clean = butter_bandpass_filter(signal, .4, 4, sf, 4, dtype = dtype_clean)
+        # PPG peaks are detected once over the whole signal, windows slice them with searchsorted,
+        # troughs are not used by HRV metrics and are not computed
+        ppg_peaks, _ = ppg_findpeaks(signal_clean, sf, troughs = False)
     elif type in ['RPeaks','RR']:
         signal_clean = signal
+    if type != 'ECG': peaks_fractional = False
     hrv_neurokit = None; hrv_nk = None
+    # with lomb psd_method freq & pwr metrics are deferred and computed
+    # for all pending windows at once before each cache write
+    hf_ex = [9/60,1.5]; lomb_pending = []
+    lomb_metrics = [] if metrics is None or psd_method != 'lomb' else [m for m in metrics if m in psd_metrics]
     
     # load cache
     if cache_dir is not None: 
@@ -97,9 +144,24 @@ def hrv_process(
                     s_past = (slided - slided_past)*window/60
                     logger.info(f'{device} {hrv_cache_tag} {round((ss/sf)/60)}m {round(100*i/signal_end)}% {round(s_past/ss_past,1)} s-m/s {spd(ss_first, ss_started)} at {se_dt.strftime("%Y-%m-%d %H:%M:%S")}')
                     ss_started = now(); slided_past = slided
-                segment_clean = signal_clean[ss:se]
+                segment_clean = signal_clean[..., ss:se]
                 try:
-                    if type == 'ECG':
+                    if type == 'ECG' and channels:
+                        # best lead of window by template correlation, beats fused by cross-lead voting
+                        window_peaks = [p[np.searchsorted(p, ss):np.searchsorted(p, se)] - ss for p in lead_peaks]
+                        lead_cor = beats_cor_leads(segment_clean, window_peaks, sf)
+                        if np.all(np.isnan(lead_cor)):
+                            peaks_n = 0
+                        else:
+                            lead = int(np.nanargmax(lead_cor))
+                            segment_clean = segment_clean[lead]
+                            rpeaks = peaks_fuse(window_peaks, lead, sf)
+                            peaks_n = len(rpeaks)
+                    elif type == 'ECG' and detect_sf is not None:
+                        peaks_ss, peaks_se = np.searchsorted(ecg_peaks, [ss, se])
+                        rpeaks = ecg_peaks[peaks_ss:peaks_se] - ss
+                        peaks_n = len(rpeaks)
+                    elif type == 'ECG':
                         # https://www.samproell.io/posts/signal/ecg-library-comparison/
                         rpeaks_res = nk.ecg_findpeaks(segment_clean, sampling_rate=sf, method='neurokit')
                         if rpeaks_res is not None:
@@ -109,14 +171,9 @@ def hrv_process(
                             logger.info(f'no peaks found: {rpeaks_res}')
                             peaks_n = 0
                     elif type == 'PPG':
-                        detector = PeakDetector(wave_type='ppg',fs=sf)
-                        rpeaks, trough_list = detector.ppg_detector(segment_clean, detector_type=1)
-                        if rpeaks is not None:
-                            rpeaks = np.array(rpeaks)
-                            peaks_n = len(rpeaks)
-                        else:
-                            logger.info(f'no peaks found: {rpeaks_res}')
-                            peaks_n = 0
+                        peaks_ss, peaks_se = np.searchsorted(ppg_peaks, [ss, se])
+                        rpeaks = ppg_peaks[peaks_ss:peaks_se] - ss
+                        peaks_n = len(rpeaks)
                     elif type in ['RPeaks','RR']:
                         rpeaks = rpeaks_all[(rpeaks_all >= ss) & (rpeaks_all < se)]
                         peaks_n = len(rpeaks)
@@ -127,12 +184,23 @@ def hrv_process(
                 if peaks_n > 2:
                     r1, r2, r3_v = peaks_sqi(rpeaks, window, min_hr, max_hr)
                     if not r1:
-                        if type in ['ECG','PPG']:
-                            r4_cor = beats_cor_sqi(segment_clean, rpeaks, sf)
+                        if channels:
+                            r4_cor = lead_cor[lead]
+                        elif type in ['ECG','PPG']:
+                            # beats are segmented at sample positions, refined peaks are fractional
+                            r4_cor = beats_cor_sqi(segment_clean, np.round(rpeaks).astype(int), sf)
                         elif type in ['RPeaks','RR']:
                             r4_cor = np.nan
                         # 1st round of R-peaks correction: Kubios method
-                        info, rpeaks_corrected = nk.signal_fixpeaks(rpeaks, sampling_rate=sf, method = 'Kubios', iterative=True, show=False)
+                        if peaks_fractional:
+                            # correction works on sample positions (corrected peaks are cast to int), refined / fused peaks
+                            # are rounded for it and peaks left in place get back their sub-sample position for RR
+                            rpeaks_samples = np.round(rpeaks).astype(int)
+                            info, rpeaks_corrected = nk.signal_fixpeaks(rpeaks_samples, sampling_rate=sf, method = 'Kubios', iterative=True, show=False)
+                            kept = np.clip(np.searchsorted(rpeaks_samples, rpeaks_corrected), 0, len(rpeaks_samples) - 1)
+                            rpeaks_corrected = np.where(rpeaks_samples[kept] == rpeaks_corrected, np.asarray(rpeaks)[kept], rpeaks_corrected)
+                        else:
+                            info, rpeaks_corrected = nk.signal_fixpeaks(rpeaks, sampling_rate=sf, method = 'Kubios', iterative=True, show=False)
                         sf_interp = 1000; 
                         if sf == sf_interp:
                             rpeaks_corrected_ms = rpeaks_corrected
@@ -151,9 +219,14 @@ def hrv_process(
                         rpeaks_final = np.cumsum(np.append(rpeaks_corrected_ms[0], rr_final_ms))*sf/sf_interp
                         rpeaks_final_n = len(rpeaks_final)
                         # sometimes interpolation results in start peaks being negative, 
-                        # ignore these segments as this due to removed corner beats
-                        if(min(rpeaks_final) > 0):
-                            corrected = np.where(~np.isin(rpeaks, rpeaks_final))[0].astype(int)
+                        # ignore these segments as this due to removed corner beats.
+                        # a peak at 0 is valid: RR / RPeaks recordings (and live hub chunks) start with a beat at 0
+                        if(min(rpeaks_final) >= 0):
+                            if peaks_fractional:
+                                # refined / fused peaks are fractional, so peaks are corrected when moved by more than half a sample
+                                corrected = np.where(np.abs(rpeaks - rpeaks_final[nearest_indices(rpeaks_final, rpeaks)]) > 0.5)[0].astype(int)
+                            else:
+                                corrected = np.where(~np.isin(rpeaks, rpeaks_final))[0].astype(int)
                             ectopic = np.unique(np.concatenate((info['ectopic'], rpeaks_corrected[np.where(np.isnan(rr_corrected_ectopic_ms))[0]]))).astype(int)
                             missed = info['missed']
                             longshort = info['longshort']
@@ -166,7 +239,8 @@ def hrv_process(
                                 hrv_nk = {f'hr_{window}s': rpeaks_final_n*60/(window)}
                             else:
                                 try:
-                                    hrv_nk = hrv_segment(rpeaks_final, sf, hf_ex = [9/60,1.5], window = window, metrics = metrics)
+                                    segment_metrics = [m for m in metrics if m not in lomb_metrics]
+                                    hrv_nk = hrv_segment(rpeaks_final, sf, hf_ex = hf_ex, window = window, metrics = segment_metrics, dtype = dtype)
                                 except Exception as error:
                                     logger.warning(error)
                                     hrv_nk = None
@@ -176,8 +250,12 @@ def hrv_process(
                                            'ectopic':len(ectopic),'missed':len(missed),'extra':len(extra),
                                            'longshort':len(longshort),'corrected':len(corrected),
                                            'r1':r1,'r2':r2,'r3_v':r3_v,'r4_cor':r4_cor}
-                                hrv_nk.update(hrv_ext)
-                                hrv_neurokit = pd.concat([hrv_neurokit,pd.DataFrame.from_dict([hrv_nk])])
+                                if channels: hrv_ext['lead'] = lead
+                                if len(lomb_metrics) > 0:
+                                    lomb_pending.append([hrv_nk, hrv_ext, rpeaks_final])
+                                else:
+                                    hrv_nk.update(hrv_ext)
+                                    hrv_neurokit = pd.concat([hrv_neurokit,pd.DataFrame.from_dict([hrv_nk])])
                 if verbose: 
                     if hrv_nk is not None:
                         if f'rmssd_{window}s' in hrv_nk.keys():
@@ -186,6 +264,9 @@ def hrv_process(
                             logger.info(f'{device} {hrv_cache_tag} {round((ss/sf)/60)}m {round(100*i/signal_end)}% | hr: {round(np.nanmean(hrv_nk[f"hr_{window}s"]))} | {spd(ss_first, ss_started)} at {se_dt.strftime("%Y-%m-%d %H:%M:%S")}')
                     else:
                         logger.info(f'{device} {hrv_cache_tag} {round((ss/sf)/60)}m {round(100*i/signal_end)}% | {spd(ss_first, ss_started)} at {se_dt.strftime("%Y-%m-%d %H:%M:%S")}') 
+            if (len(lomb_pending) > 0) and (debug or (i % progress_step == 0) or (i >= signal_end-1)):
+                hrv_neurokit = pd.concat([hrv_neurokit, hrv_lomb_pending(lomb_pending, sf, hf_ex, window, lomb_metrics)])
+                lomb_pending = []
             if debug:
                 logger.info(hrv_neurokit)
                 break
@@ -204,3 +285,13 @@ def hrv_process(
     else:
         return hrv_neurokit
     return None
+
+def hrv_lomb_pending(lomb_pending, sf, hf_ex, window, metrics):
+    # vectorized Lomb-Scargle freq & pwr metrics for all pending windows, merged into their rows
+    hrv_lomb_all = hrv_lomb([rpeaks for hrv_nk, hrv_ext, rpeaks in lomb_pending], sf, hf_ex = hf_ex, window = window, metrics = metrics)
+    rows = []
+    for [hrv_nk, hrv_ext, rpeaks], hrv_l in zip(lomb_pending, hrv_lomb_all):
+        hrv_nk.update({f'{key}_{window}s': value for key, value in hrv_l.items()})
+        hrv_nk.update(hrv_ext)
+        rows.append(hrv_nk)
+    return pd.DataFrame.from_dict(rows)
@@ -2,8 +2,10 @@ import numpy as np
 import pandas as pd
 import neurokit2 as nk
 import logging
-from  ..signal import sc_interp1d, signal_detrend_tarvainen2002
+from  ..signal import sc_interp1d, signal_detrend_tarvainen2002, nearest_indices
 from .metrics import ans, bsi, rRR
+from .lomb import hrv_lomb
+from .nonlinear import nl_entropy, hrv_poincare, hrv_dfa_alpha1, hrv_entropy
 
 logger = logging.getLogger("qskit")
 logger.setLevel(logging.INFO)
@@ -12,7 +14,13 @@ logger.setLevel(logging.INFO)
 import warnings
 warnings.filterwarnings("ignore")
 
-def hrv_segment(rpeaks, sf, hf_ex = [9/60,1.5], window = 60, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'], debug_file = None):
+# psd_method of freq & pwr metrics, lomb computes them from unevenly sampled RR (see lomb.py)
+psd_methods = ['welch', 'lomb']
+psd_metrics = ['freq', 'pwr']
+
+def hrv_segment(rpeaks, sf, hf_ex = [9/60,1.5], window = 60, metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr'], psd_method = 'welch', dtype = np.float64, debug_file = None):
+    if psd_method not in psd_methods:
+        raise ValueError(f'wrong psd_method, must be one of {psd_methods}')
     sf_interp = 1000
     rr = np.diff(rpeaks)
     if debug_file is not None: 
@@ -24,38 +32,43 @@ def hrv_segment(rpeaks, sf, hf_ex = [9/60,1.5], window = 60, metrics = ['time','
     else:
         rr_up = rr * sf_interp / sf 
         rpeaks_up = rpeaks * sf_interp / sf
-    # upsample (interpolate) rr to continuous signal with sf_interp sample frequency
-    interpolation_method = 'pchip'; desired_len = int(rpeaks_up[1:][-1]-rpeaks_up[0])
-    rpeaks_up_interp, rr_up_interp = sc_interp1d(rpeaks_up[1:]-rpeaks_up[0], rr_up, desired_len = desired_len, m = interpolation_method)
-    rpeaks_up_interp += rpeaks_up[0]
+    # with lomb psd_method freq & pwr metrics use RR at beat times, interpolated RR are only needed by other metrics
+    if any(m not in psd_metrics for m in metrics) or psd_method != 'lomb':
+        # upsample (interpolate) rr to continuous signal with sf_interp sample frequency
+        interpolation_method = 'pchip'; desired_len = int(rpeaks_up[1:][-1]-rpeaks_up[0])
+        rpeaks_up_interp, rr_up_interp = sc_interp1d(rpeaks_up[1:]-rpeaks_up[0], rr_up, desired_len = desired_len, m = interpolation_method, dtype = dtype)
+        rpeaks_up_interp += rpeaks_up[0]
 
-    # downsample (interpolate) rr signal to 4hz
-    interpolation_method = 'pchip'
-    # https://www.kubios.com/downloads/HRV-Scientific-Users-Guide.pdf
-    # . In addition, the interpolation rate 
-    # (by default a 4 Hz cubic spline interpolation is applied to form equidistantly sampled 
-    # time series from the IBI data) and detrending method 
-    # (by default smoothness priors method is used to remove very low frequency 
-    # trend components) can be adjusted here. The default detrending settings 
-    # will remove most of the very low frequency components (frequencies below 0.04 Hz) 
-    # from the RR interval series prior to analysis
-    f_detrend = 1/4; detrend_len = int(round(len(rpeaks_up_interp) / (sf_interp * f_detrend)))
-    rpeaks_down_interp, rr_down_interp = sc_interp1d(rpeaks_up_interp, rr_up_interp, desired_len = detrend_len, m = interpolation_method)
-    # detrend 4 Hz RR intervals
-    rr_detrended = signal_detrend_tarvainen2002(rr_down_interp, 500)
-    interpolation_method = 'pchip'
-    # interpolate detrended signal back to sf_interp
-    rpeaks_detrended_up, rr_detrended_up_interp = sc_interp1d(rpeaks_down_interp, rr_detrended, desired_len = desired_len, m = interpolation_method)
-    # calculate detrended signal based on interpolated RR
-    # trend_up_interp = rr_up_interp - rr_detrended_up_interp
-    # find nearest trend points for each peak   
-    nearest_trend_indices = np.abs(rpeaks[1:,np.newaxis] * sf_interp/sf - rpeaks_detrended_up).argmin(axis=1)
-    # select RR peaks at nearest trend points and shift min detrended RR at same values as trended minimum
-    rr_detrended_up = min(rr_up) - min(rr_detrended_up_interp[nearest_trend_indices]) + rr_detrended_up_interp[nearest_trend_indices]    
+        # downsample (interpolate) rr signal to 4hz
+        interpolation_method = 'pchip'
+        # https://www.kubios.com/downloads/HRV-Scientific-Users-Guide.pdf
+        # . In addition, the interpolation rate 
+        # (by default a 4 Hz cubic spline interpolation is applied to form equidistantly sampled 
+        # time series from the IBI data) and detrending method 
+        # (by default smoothness priors method is used to remove very low frequency 
+        # trend components) can be adjusted here. The default detrending settings 
+        # will remove most of the very low frequency components (frequencies below 0.04 Hz) 
+        # from the RR interval series prior to analysis
+        f_detrend = 1/4; detrend_len = int(round(len(rpeaks_up_interp) / (sf_interp * f_detrend)))
+        rpeaks_down_interp, rr_down_interp = sc_interp1d(rpeaks_up_interp, rr_up_interp, desired_len = detrend_len, m = interpolation_method, dtype = dtype)
+        # detrend 4 Hz RR intervals, short series, solved in float64
+        rr_detrended = signal_detrend_tarvainen2002(rr_down_interp.astype(np.float64), 500)
+        interpolation_method = 'pchip'
+        # interpolate detrended signal back to sf_interp
+        rpeaks_detrended_up, rr_detrended_up_interp = sc_interp1d(rpeaks_down_interp, rr_detrended, desired_len = desired_len, m = interpolation_method, dtype = dtype)
+        # calculate detrended signal based on interpolated RR
+        # trend_up_interp = rr_up_interp - rr_detrended_up_interp
+        # find nearest trend points for each peak   
+        nearest_trend_indices = nearest_indices(rpeaks_detrended_up, rpeaks[1:] * sf_interp/sf)
+        # select RR peaks at nearest trend points and shift min detrended RR at same values as trended minimum
+        # beat level RR are accumulated (cumsum, variance) in metrics, keep them in float64
+        rr_detrended_up = (min(rr_up) - min(rr_detrended_up_interp[nearest_trend_indices]) + rr_detrended_up_interp[nearest_trend_indices]).astype(np.float64)
+        # nonlinear indices of RR without first interval, as previously computed by nk.hrv_nonlinear from cumulated RR,
+        # computed directly so that nk.hrv_nonlinear complexity indices are not calculated for every window
+        rr_nl = rr_detrended_up[1:]
 
     hrv_time_cols = ['rmssd','sdnn']
     hrv_freq_cols = ['hf','lf','lfn','hfn']
-    hrv_nl_cols = ['sd1','sd2','dfa_alpha1']
     
     # https://sci-hub.ru/10.1123/pes.19.2.192
     #  Because each spectrogram window was made of 256 successive R-R periods, the time between R-R periods after resampling was 0.25 s. 
@@ -72,15 +85,20 @@ def hrv_segment(rpeaks, sf, hf_ex = [9/60,1.5], window = 60, metrics = ['time','
         hrv_time = nk.hrv_time(np.cumsum(rr_detrended_up), sf_interp)
         hrv_time.rename(columns=lambda x: x.replace('HRV_', '').lower(), inplace=True)
         hrv_all.update(hrv_time[hrv_time_cols].iloc[0].to_dict())
-    if 'freq' in metrics:
+    if psd_method == 'lomb':
+        # Lomb-Scargle PSD directly from unevenly sampled RR, without interpolation
+        hrv_all.update(hrv_lomb([rpeaks], sf, hf_ex = hf_ex, window = window, metrics = metrics)[0])
+    elif 'freq' in metrics:
         hrv_freq = nk.hrv_frequency(np.cumsum(rr_detrended_up), sampling_rate=sf_interp, psd_method='welch', interpolation_rate = 100, normalize = False)
         hrv_freq.rename(columns=lambda x: x.replace('HRV_', '').lower(), inplace=True)
         hrv_all.update(hrv_freq[hrv_freq_cols].iloc[0].to_dict())
     if 'nl' in metrics:
-        hrv_nl = nk.hrv_nonlinear(np.cumsum(rr_detrended_up), sampling_rate=sf_interp)
-        hrv_nl.rename(columns=lambda x: x.replace('HRV_', '').lower(), inplace=True)
-        hrv_all.update(hrv_nl[hrv_nl_cols].iloc[0].to_dict())
-    if 'pwr' in metrics:
+        hrv_all.update(hrv_poincare(rr_nl))
+        hrv_all['dfa_alpha1'] = hrv_dfa_alpha1(rr_nl)
+    # entropies only when requested by name in metrics: 'sampen', 'apen', 'mse'
+    if any(m in metrics for m in nl_entropy):
+        hrv_all.update(hrv_entropy(rr_nl, metrics))
+    if ('pwr' in metrics) and (psd_method != 'lomb'):
         # power in extended high frequency band
         pwr_hf_ex = nk.signal_power(rr_detrended_up_interp, frequency_band=hf_ex,sampling_rate=sf_interp,show=False,min_frequency=0,method="welch",max_frequency=max(hf_ex),order_criteria=None,normalize=False)
         psd = nk.signal_psd(rr_detrended_up_interp,sampling_rate=sf_interp,show=False,min_frequency=0,method="welch",max_frequency=max(hf_ex),order_criteria=None,normalize=False)
@@ -88,7 +106,8 @@ def hrv_segment(rpeaks, sf, hf_ex = [9/60,1.5], window = 60, metrics = ['time','
         # peaks frequency & power in extended high frequency band, which is related to respiration
         hrv_all['ex_hf_peak_freq'] = hf_ex_psd['Frequency'].iloc[np.argmax(hf_ex_psd['Power'])]
         hrv_all['resp'] = 1/hrv_all['ex_hf_peak_freq']
-        hrv_all['ex_hf_peak_power'] = hf_ex_psd['Frequency'].iloc[np.argmax(hf_ex_psd['Power'])]
+        # psd value (ms^2/Hz) at peak frequency, as in lomb psd_method (was peak frequency, same as ex_hf_peak_freq)
+        hrv_all['ex_hf_peak_power'] = hf_ex_psd['Power'].iloc[np.argmax(hf_ex_psd['Power'])]
         hrv_all['ex_hf_power'] = pwr_hf_ex.iloc[0].iloc[0]
     if ('ans' in metrics) and (window >= 30):
         hrv_all['bsi'] = bsi(rr_detrended_up, sf_interp)
@@ -0,0 +1,123 @@
+import numpy as np
+from ..signal import signal_detrend_tarvainen2002
+
+# Lomb-Scargle periodogram computed directly on unevenly sampled RR intervals,
+# no interpolation / resampling of RR onto a regular grid is needed
+# https://www.kubios.com/downloads/HRV-Scientific-Users-Guide.pdf (Lomb-Scargle PSD)
+# https://pubmed.ncbi.nlm.nih.gov/9438777/ (Laguna et al. 1998, power spectral density of unevenly sampled data)
+
+# RR are detrended with smoothness priors at beat times and lfn / hfn use total power of resolved bands as in Welch path,
+# but neurokit Welch PSD only starts at 4/window (e.g. LF from 0.067 Hz for 60s windows), while Lomb-Scargle
+# resolves from 1/window, so lf / lfn of short windows are not strictly comparable between psd_method values
+
+# frequency bands in Hz, same as neurokit hrv_frequency defaults
+lomb_bands = {'vlf': [0.0033, 0.04], 'lf': [0.04, 0.15], 'hf': [0.15, 0.4], 'vhf': [0.4, 0.5]}
+
+def lomb_freqs(hf_ex = [9/60,1.5], window = 60, oversample = 4):
+    # fixed frequency grid from VLF up to the end of extended HF band,
+    # step is oversampled spectral resolution of the window 1/(oversample*window)
+    df = 1 / (oversample * window)
+    f_max = max(max(hf_ex), lomb_bands['vhf'][1])
+    return np.arange(lomb_bands['vlf'][0], f_max + df, df)
+
+def lomb_pad(rpeaks_list, sf):
+    # convert list of rpeaks (one array per window) into nan padded 2d arrays:
+    # t - beat time in seconds relative to window start, rr - RR intervals in ms
+    n = max([len(rpeaks) - 1 for rpeaks in rpeaks_list])
+    t = np.full((len(rpeaks_list), n), np.nan)
+    rr = np.full((len(rpeaks_list), n), np.nan)
+    for i, rpeaks in enumerate(rpeaks_list):
+        rpeaks = np.asarray(rpeaks, dtype = np.float64)
+        t[i, :len(rpeaks) - 1] = (rpeaks[1:] - rpeaks[0]) / sf
+        rr[i, :len(rpeaks) - 1] = np.diff(rpeaks) * 1000 / sf
+    return t, rr
+
+def lomb_detrend(t, rr, regularization = 500, f_detrend = 4):
+    # smoothness priors detrending applied directly to RR indexed by beat (Tarvainen 2002), without interpolation.
+    # lambda is scaled by (beat rate / f_detrend)^2, so that trend cutoff (about 0.03 Hz) is the same as
+    # lambda 500 on 4 Hz RR in hrv_segment (Welch), detrended RR stay at their beat times
+    # https://ieeexplore.ieee.org/document/979357
+    t = np.atleast_2d(t); rr = np.atleast_2d(rr); rr_detrended = np.full(rr.shape, np.nan)
+    for i in range(t.shape[0]):
+        mask = ~np.isnan(t[i]) & ~np.isnan(rr[i])
+        rri = rr[i][mask]
+        if len(rri) < 4:
+            rr_detrended[i][mask] = rri
+            continue
+        beat_rate = 1000 / np.mean(rri)
+        rr_detrended[i][mask] = signal_detrend_tarvainen2002(rri, regularization * (beat_rate / f_detrend) ** 2)
+    return rr_detrended
+
+def lomb_scargle(t, rr, freqs, detrend = True, chunk_size = 2**22):
+    # vectorized Lomb-Scargle PSD for many windows at once
+    # t, rr: 2d arrays windows x beats, padded with nan for shorter windows
+    # returns psd windows x freqs in ms^2/Hz, scaled so that psd integral equals RR variance
+    t = np.atleast_2d(t); rr = np.atleast_2d(rr)
+    mask = ~np.isnan(t) & ~np.isnan(rr)
+    n = mask.sum(axis = 1)
+    t0 = np.where(mask, t, 0); y = np.where(mask, rr, 0)
+    # remove mean (and linear trend) of each window
+    t_mean = t0.sum(axis = 1, keepdims = True) / n[:, None]
+    y = np.where(mask, y - y.sum(axis = 1, keepdims = True) / n[:, None], 0)
+    if detrend:
+        tc = np.where(mask, t0 - t_mean, 0)
+        slope = (tc * y).sum(axis = 1, keepdims = True) / (tc ** 2).sum(axis = 1, keepdims = True)
+        y = np.where(mask, y - slope * tc, 0)
+    duration = np.nanmax(t, axis = 1) - np.nanmin(t, axis = 1)
+    w = 2 * np.pi * np.asarray(freqs)
+    psd = np.empty((t.shape[0], len(w)))
+    # process windows in chunks to keep windows x freqs x beats arrays bounded in memory
+    step = max(1, int(chunk_size // (len(w) * t.shape[1])))
+    for s in range(0, t.shape[0], step):
+        e = s + step
+        arg = w[None, :, None] * (t0[s:e] - t_mean[s:e])[:, None, :]
+        c = np.cos(arg); sn = np.sin(arg)
+        m = mask[s:e, None, :]
+        yc = np.einsum('wfn,wn->wf', c, y[s:e]); ys = np.einsum('wfn,wn->wf', sn, y[s:e])
+        # sums of cos(2wt), sin(2wt) via double angle identities
+        c2 = (m * (2 * c * c - 1)).sum(axis = 2); s2 = (m * 2 * c * sn).sum(axis = 2)
+        # time offset tau makes the periodogram invariant to time shifts
+        wtau = 0.5 * np.arctan2(s2, c2)
+        cos_tau = np.cos(wtau); sin_tau = np.sin(wtau)
+        yc_tau = cos_tau * yc + sin_tau * ys
+        ys_tau = cos_tau * ys - sin_tau * yc
+        # sum of cos^2(w(t-tau)) = (n + cos(2wtau)*c2 + sin(2wtau)*s2)/2 = (n + |c2,s2|)/2
+        cc = 0.5 * (n[s:e, None] + np.hypot(c2, s2))
+        ss = n[s:e, None] - cc
+        p = 0.5 * (yc_tau ** 2 / cc + ys_tau ** 2 / np.where(ss > 0, ss, np.nan))
+        # p peak for sinusoid of amplitude A is n*A^2/4, scale so that peak*df (df = 1/duration) is A^2/2
+        psd[s:e] = p * 2 * duration[s:e, None] / n[s:e, None]
+    return psd
+
+def lomb_band_power(psd, freqs, band):
+    df = freqs[1] - freqs[0]
+    band_mask = (freqs >= min(band)) & (freqs < max(band))
+    return np.nansum(psd[:, band_mask], axis = 1) * df
+
+def hrv_lomb(rpeaks_list, sf, hf_ex = [9/60,1.5], window = 60, metrics = ['freq','pwr']):
+    # frequency domain metrics for all windows of a recording in one vectorized pass
+    # returns list of dicts with same keys as hrv_segment freq and pwr metrics
+    freqs = lomb_freqs(hf_ex, window)
+    t, rr = lomb_pad(rpeaks_list, sf)
+    psd = lomb_scargle(t, lomb_detrend(t, rr), freqs, detrend = False)
+    power = {band: lomb_band_power(psd, freqs, lomb_bands[band]) for band in lomb_bands}
+    # bands starting below 1/window are not resolved in a window (e.g. VLF for windows < 5 min),
+    # they are left out of total power, as neurokit returns nan VLF for short windows
+    total = np.nansum([power[band] for band in lomb_bands if lomb_bands[band][0] >= 1 / window], axis = 0)
+    hrv_all = [{} for i in range(len(rpeaks_list))]
+    if 'freq' in metrics:
+        for i, hrv in enumerate(hrv_all):
+            hrv.update({'hf': power['hf'][i], 'lf': power['lf'][i], 'lfn': power['lf'][i] / total[i], 'hfn': power['hf'][i] / total[i]})
+    if 'pwr' in metrics:
+        # peak frequency & power in extended high frequency band, which is related to respiration
+        # power above mean beat rate Nyquist frequency 1/(2*meannn) is aliased, exclude it
+        nyquist = 1000 / (2 * np.nanmean(rr, axis = 1))
+        hf_ex_mask = (freqs >= min(hf_ex)) & (freqs <= max(hf_ex))
+        hf_ex_psd = np.where(freqs[hf_ex_mask][None, :] <= nyquist[:, None], psd[:, hf_ex_mask], np.nan)
+        peak = np.argmax(np.nan_to_num(hf_ex_psd, nan = -np.inf), axis = 1)
+        peak_freq = freqs[hf_ex_mask][peak]
+        peak_power = hf_ex_psd[np.arange(len(peak)), peak]
+        ex_hf_power = np.nansum(hf_ex_psd, axis = 1) * (freqs[1] - freqs[0])
+        for i, hrv in enumerate(hrv_all):
+            hrv.update({'ex_hf_peak_freq': peak_freq[i], 'resp': 1 / peak_freq[i], 'ex_hf_peak_power': peak_power[i], 'ex_hf_power': ex_hf_power[i]})
+    return hrv_all
@@ -0,0 +1,117 @@
+import numpy as np
+import neurokit2 as nk
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.spatial import cKDTree
+
+# nonlinear HRV indices of RR intervals (ms): poincare sd1 / sd2, dfa alpha1 and complexity entropies
+# SampEn / ApEn / multiscale entropy count template matches under chebyshev distance with kd-tree neighbour
+# counting (scipy cKDTree, p = inf) instead of O(n^2) template comparison, trees are built once for all tolerances,
+# SampEn & MSE only need pair totals (dual tree count_neighbors), per template counts are computed for ApEn only.
+# embeddings are strided views, match counts of m and m+1 templates are shared by SampEn, ApEn and MSE (scale 1)
+# https://journals.physiology.org/doi/full/10.1152/ajpheart.2000.278.6.H2039 (SampEn)
+# https://journals.aps.org/prl/abstract/10.1103/PhysRevLett.89.068102 (MSE)
+
+# indices selectable by name in hrv_segment metrics, besides 'nl' group (sd1, sd2, dfa_alpha1)
+nl_entropy = ['sampen', 'apen', 'mse']
+
+def hrv_poincare(rr):
+    # same as nk.hrv_nonlinear SD1 / SD2
+    x1 = (rr[:-1] - rr[1:]) / np.sqrt(2)
+    x2 = (rr[:-1] + rr[1:]) / np.sqrt(2)
+    return {'sd1': np.std(x1, ddof = 1), 'sd2': np.std(x2, ddof = 1)}
+
+def hrv_dfa_alpha1(rr, scale = [4, 11]):
+    # short term DFA as nk.hrv_nonlinear DFA_alpha1, without multifractal & alpha2 indices
+    return nk.fractal_dfa(rr, multifractal = False, scale = np.arange(scale[0], scale[1] + 1))[0]
+
+def entropy_tolerance(rr, r = 0.2):
+    # r * SD, as in nk.hrv_nonlinear
+    return r * np.std(rr, ddof = 1)
+
+def entropy_embedding(x, dimension = 2, delay = 1):
+    # templates of dimension points as rows, strided view without copy
+    return sliding_window_view(np.asarray(x, dtype = np.float64), (dimension - 1) * delay + 1)[:, ::delay]
+
+def entropy_counts(templates, tolerance, limit = None, counts = True):
+    # matches of each template (self included) for each tolerance, tolerance x templates (ApEn counts, None unless counts),
+    # and number of ordered pairs of distinct templates before limit (SampEn counts), per tolerance
+    # pairs are counted with a dual kd-tree traversal under chebyshev distance, per template matches with ball queries
+    r = np.atleast_1d(tolerance).astype(np.float64)
+    n = len(templates)
+    if limit is None: limit = n
+    limit = min(limit, n)
+    if n == 0:
+        return (np.ones((len(r), 0), dtype = np.int64) if counts else None), np.zeros(len(r), dtype = np.int64)
+    if not counts:
+        tree = cKDTree(templates[:limit]) if limit > 0 else None
+        return None, (tree.count_neighbors(tree, r, p = np.inf) - limit).astype(np.int64) if limit > 0 else np.zeros(len(r), dtype = np.int64)
+    tree = cKDTree(templates)
+    counts = np.array([tree.query_ball_point(templates, rk, p = np.inf, return_length = True) for rk in r], dtype = np.int64)
+    # pairs before limit from per template counts, minus matches with the few templates after limit (delay of last points)
+    distance = np.abs(templates[:limit, None, :] - templates[None, limit:, :]).max(axis = 2)
+    pairs = counts[:, :limit].sum(axis = 1) - limit - np.array([np.count_nonzero(distance <= rk) for rk in r], dtype = np.int64)
+    return counts, pairs
+
+def entropy_matches(x, dimension = 2, tolerance = 0.2, delay = 1, counts = True):
+    # match counts of m templates, SampEn m pairs (templates followed by a point), match counts & pairs of m+1 templates
+    # per template counts (counts_m, counts_m1) are only needed by ApEn, None unless counts
+    templates_m1 = entropy_embedding(x, dimension + 1, delay)
+    counts_m, pairs_m = entropy_counts(entropy_embedding(x, dimension, delay), tolerance, limit = len(templates_m1), counts = counts)
+    counts_m1, pairs_m1 = entropy_counts(templates_m1, tolerance, counts = counts)
+    return counts_m, pairs_m, counts_m1, pairs_m1
+
+def entropy_sample(x, dimension = 2, tolerance = None, delay = 1, matches = None):
+    # SampEn = -log(A / B), B & A: pairs of m & m+1 templates within tolerance, self matches excluded
+    # tolerance may be an array, all tolerances share the same kd-trees
+    if tolerance is None: tolerance = entropy_tolerance(x)
+    if matches is None: matches = entropy_matches(x, dimension, tolerance, delay, counts = False)
+    _, b, _, a = matches
+    # no m matches is undefined, no m+1 matches is infinite entropy
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        sampen = np.where(b > 0, -np.log(a / b), np.nan)
+    return sampen if np.ndim(tolerance) > 0 else sampen[0]
+
+def entropy_approximate(x, dimension = 2, tolerance = None, delay = 1, matches = None):
+    # ApEn = phi(m) - phi(m+1), phi: mean log fraction of templates within tolerance, self matches included
+    if tolerance is None: tolerance = entropy_tolerance(x)
+    if matches is None: matches = entropy_matches(x, dimension, tolerance, delay)
+    counts_m, _, counts_m1, _ = matches
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        apen = np.abs(np.mean(np.log(counts_m / counts_m.shape[1]), axis = 1) - np.mean(np.log(counts_m1 / counts_m1.shape[1]), axis = 1))
+    return apen if np.ndim(tolerance) > 0 else apen[0]
+
+def entropy_coarse(x, scale):
+    # non overlapping coarse graining, means of consecutive scale points
+    n = len(x) // scale
+    return np.mean(np.reshape(x[:n * scale], (n, scale)), axis = 1)
+
+def entropy_multiscale(x, scales = None, dimension = 2, tolerance = None, matches = None):
+    # MSE: SampEn of coarse grained series at each scale with tolerance of original series,
+    # index is area under finite SampEn values divided by their number (as nk.entropy_multiscale MSEn)
+    # matches of original series (scale 1) are reused when given
+    if tolerance is None: tolerance = entropy_tolerance(x)
+    if scales is None: scales = np.arange(1, int(len(x) / (dimension + 10)))
+    values = np.array([entropy_sample(x, dimension, tolerance, matches = matches) if scale == 1 else
+                       entropy_sample(entropy_coarse(x, scale), dimension, tolerance) for scale in scales])
+    mse = []
+    for v in (values.T if values.ndim > 1 else [values]):
+        v = v[np.isfinite(v)]
+        mse.append(np.trapz(v) / len(v) if len(v) > 0 else np.nan)
+    return (np.array(mse) if values.ndim > 1 else mse[0]), values
+
+def hrv_entropy(rr, metrics = nl_entropy, dimension = 2, r = 0.2, scales = None):
+    # requested entropies of RR intervals, template matches of RR series are counted once and shared
+    metrics = [m for m in metrics if m in nl_entropy]
+    if len(metrics) == 0:
+        return {}
+    rr = np.asarray(rr, dtype = np.float64)
+    tolerance = entropy_tolerance(rr, r)
+    matches = entropy_matches(rr, dimension, tolerance, counts = 'apen' in metrics)
+    hrv_e = {}
+    if 'sampen' in metrics:
+        hrv_e['sampen'] = entropy_sample(rr, dimension, tolerance, matches = matches)
+    if 'apen' in metrics:
+        hrv_e['apen'] = entropy_approximate(rr, dimension, tolerance, matches = matches)
+    if 'mse' in metrics:
+        hrv_e['mse'] = entropy_multiscale(rr, scales, dimension, tolerance, matches = matches)[0]
+    return hrv_e
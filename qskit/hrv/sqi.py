@@ -62,6 +62,18 @@ def beats_cor_sqi(ecg_signal, peaks, sf):
     correlations = [np.corrcoef(mean_beat, sublist)[0, 1] for sublist in beats]        
     return np.mean(correlations)
 
+def beats_cor_leads(segments, peaks, sf):
+    # beats_cor_sqi of each lead of multi-channel ECG segment (channels x samples) with its own peaks,
+    # nan for leads with less than 3 peaks or failed beats segmentation
+    cor = np.full(len(peaks), np.nan)
+    for c, lead_peaks in enumerate(peaks):
+        if len(lead_peaks) > 2:
+            try:
+                cor[c] = beats_cor_sqi(segments[c], np.round(lead_peaks).astype(int), sf)
+            except Exception:
+                cor[c] = np.nan
+    return cor
+
 # We use a limit of 2.2 to allow for a single missed beat.)
 # The optimum threshold for the average correlation coefficient was found to be 
 # 0.66 for the ECG SQI and 0.86 for the PPG SQI.
@@ -0,0 +1,147 @@
+import pandas as pd
+import datetime
+import glob
+import os
+import re
+import logging
+
+logger = logging.getLogger("qskit")
+
+# local store of hrv_process results, partitioned by user / device / window / day:
+#   {root}/{user}/{device}/{window}s/{YYYY-MM-DD}.csv   windows of one day, sorted by dt (window end)
+#   {root}/{user}/{device}/{window}s/rollup_hourly.csv  hourly aggregates
+#   {root}/{user}/{device}/{window}s/rollup_nightly.csv nightly aggregates, night is keyed by its evening date
+# range queries only read day partitions overlapping the range,
+# rollups are recomputed only for hours / nights touched by newly added windows
+
+# metrics aggregated in rollups, as {metric}_{window}s columns
+rollup_metrics = ['hr', 'rmssd', 'sdnn', 'lfn', 'hfn', 'resp', 'bsi', 'sns', 'pns', 'ans']
+rollup_freqs = ['hourly', 'nightly']
+
+def hrv_store_path(root, user, device, window):
+    return os.path.join(root, str(user), str(device), f'{window}s')
+
+def hrv_window(hrv):
+    # window length in seconds from hr_{window}s column
+    for col in hrv.columns:
+        match = re.match(r'^hr_(\d+)s$', col)
+        if match: return int(match.group(1))
+    return None
+
+def hrv_store_days(path, start = None, end = None):
+    # day partitions overlapping [start, end)
+    days = {}
+    for file in glob.glob(os.path.join(path, '*.csv')):
+        name = os.path.splitext(os.path.basename(file))[0]
+        if re.match(r'^\d{4}-\d{2}-\d{2}$', name):
+            days[datetime.date.fromisoformat(name)] = file
+    if start is not None: days = {d: f for d, f in days.items() if d >= pd.Timestamp(start).date()}
+    if end is not None: days = {d: f for d, f in days.items() if d <= pd.Timestamp(end).date()}
+    return dict(sorted(days.items()))
+
+def hrv_store_read(file):
+    return pd.read_csv(file, parse_dates = ['dt'])
+
+def hrv_night(dt, night = [20, 8]):
+    # night key is date of its evening, windows outside night hours get NaT
+    hour = dt.dt.hour
+    in_night = (hour >= night[0]) | (hour < night[1]) if night[0] > night[1] else (hour >= night[0]) & (hour < night[1])
+    key = (dt - pd.Timedelta(hours = night[1] if night[0] > night[1] else 0)).dt.floor('D')
+    return key.where(in_night)
+
+def hrv_rollup_keys(dt, freq, night = [20, 8]):
+    if freq == 'hourly':
+        return dt.dt.floor('h')
+    elif freq == 'nightly':
+        return hrv_night(dt, night)
+    raise ValueError(f'wrong rollup freq, must be one of {rollup_freqs}')
+
+def hrv_rollup(hrv, window, freq = 'nightly', night = [20, 8], metrics = rollup_metrics):
+    # aggregates of hrv windows per hour / night: number of windows, good quality windows (q from hrv_quality),
+    # median & mean of metrics over good quality windows (all windows if q is not available)
+    hrv = hrv.assign(key = hrv_rollup_keys(hrv['dt'], freq, night)).dropna(subset = ['key'])
+    q = (hrv['q'] == True) if 'q' in hrv.columns else pd.Series(True, index = hrv.index)
+    rollup = pd.DataFrame({'windows': hrv.groupby('key').size(), 'windows_q': q.groupby(hrv['key']).sum()})
+    cols = [f'{m}_{window}s' for m in metrics if f'{m}_{window}s' in hrv.columns]
+    hrv_q = hrv[q]
+    if len(cols) > 0:
+        aggregates = hrv_q.groupby('key')[cols].agg(['median', 'mean'])
+        aggregates.columns = [f'{col}_{agg}' for col, agg in aggregates.columns]
+        rollup = rollup.join(aggregates)
+    rollup.index.name = 'dt'
+    return rollup.reset_index()
+
+def hrv_store_add(root, hrv, user = 'user', device = 'device', window = None, night = [20, 8]):
+    # add hrv_process results (one recording or more) to store and update affected rollups
+    # windows with same dt as already stored ones replace them, so re-adding a recording is safe
+    if hrv is None or len(hrv) == 0:
+        return
+    if window is None: window = hrv_window(hrv)
+    if window is None:
+        raise ValueError('window not given and no hr_{window}s column in hrv')
+    path = hrv_store_path(root, user, device, window)
+    os.makedirs(path, exist_ok = True)
+    hrv = hrv.copy(); hrv['dt'] = pd.to_datetime(hrv['dt'])
+    days = hrv['dt'].dt.floor('D')
+    for day, hrv_day in hrv.groupby(days):
+        file = os.path.join(path, f'{day.date().isoformat()}.csv')
+        if os.path.isfile(file):
+            hrv_day = pd.concat([hrv_store_read(file), hrv_day])
+        hrv_day = hrv_day.drop_duplicates(subset = ['dt'], keep = 'last').sort_values('dt')
+        hrv_day.to_csv(file, header = True, index = False)
+    for freq in rollup_freqs:
+        keys = hrv_rollup_keys(hrv['dt'], freq, night).dropna().unique()
+        if len(keys) > 0:
+            hrv_store_update_rollup(path, window, freq, pd.DatetimeIndex(keys), night)
+
+def hrv_store_update_rollup(path, window, freq, keys, night = [20, 8]):
+    # recompute rollup rows of given keys from day partitions covering them, other rows are kept
+    span = pd.Timedelta(hours = 1) if freq == 'hourly' else pd.Timedelta(days = 2)
+    hrv = hrv_store_load(path, keys.min(), keys.max() + span)
+    rollup = hrv_rollup(hrv, window, freq, night) if len(hrv) > 0 else pd.DataFrame()
+    if len(rollup) > 0:
+        rollup = rollup[rollup['dt'].isin(keys)]
+    file = os.path.join(path, f'rollup_{freq}.csv')
+    if os.path.isfile(file):
+        rollup_old = pd.read_csv(file, parse_dates = ['dt'])
+        rollup = pd.concat([rollup_old[~rollup_old['dt'].isin(keys)], rollup])
+    if len(rollup) > 0:
+        rollup.sort_values('dt').to_csv(file, header = True, index = False)
+
+def hrv_store_load(path, start = None, end = None):
+    days = hrv_store_days(path, start, end)
+    if len(days) == 0:
+        return pd.DataFrame()
+    hrv = pd.concat([hrv_store_read(file) for file in days.values()], ignore_index = True)
+    if start is not None: hrv = hrv[hrv['dt'] >= pd.Timestamp(start)]
+    if end is not None: hrv = hrv[hrv['dt'] < pd.Timestamp(end)]
+    return hrv.reset_index(drop = True)
+
+def hrv_store_query(root, user = 'user', device = 'device', window = 60, start = None, end = None, quality = False, columns = None):
+    # hrv windows with dt in [start, end), only good quality windows (q) if quality = True
+    hrv = hrv_store_load(hrv_store_path(root, user, device, window), start, end)
+    if quality and 'q' in hrv.columns:
+        hrv = hrv[(hrv['q'] == True)].reset_index(drop = True)
+    if columns is not None and len(hrv) > 0:
+        hrv = hrv[['dt'] + [c for c in columns if c != 'dt']]
+    return hrv
+
+def hrv_store_rollup(root, user = 'user', device = 'device', window = 60, freq = 'nightly', start = None, end = None):
+    # precomputed hourly / nightly aggregates with dt (hour or night evening date) in [start, end)
+    if freq not in rollup_freqs:
+        raise ValueError(f'wrong rollup freq, must be one of {rollup_freqs}')
+    file = os.path.join(hrv_store_path(root, user, device, window), f'rollup_{freq}.csv')
+    if not os.path.isfile(file):
+        return pd.DataFrame()
+    rollup = pd.read_csv(file, parse_dates = ['dt'])
+    if start is not None: rollup = rollup[rollup['dt'] >= pd.Timestamp(start)]
+    if end is not None: rollup = rollup[rollup['dt'] < pd.Timestamp(end)]
+    return rollup.reset_index(drop = True)
+
+def hrv_store_import(root, cache_dir, user = 'user', device = 'device', window = 60, slide = 30, night = [20, 8]):
+    # import final hrv_process cache files ({cache_dir}/hrv_p{window}_s{slide}-{user}-*.csv) into store
+    files = sorted(glob.glob(os.path.join(cache_dir, f'hrv_p{window}_s{slide}-{user}-*.csv')))
+    for file in files:
+        hrv_store_add(root, pd.read_csv(file), user = user, device = device, window = window, night = night)
+    logger.info(f'imported {len(files)} files into {hrv_store_path(root, user, device, window)}')
+    return len(files)
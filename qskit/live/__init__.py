@@ -0,0 +1,2 @@
+from .hub import HrvHub, hrv_dataframe
+from .replay import replay_file, replay_socket, load_recording
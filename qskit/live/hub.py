@@ -0,0 +1,191 @@
+import asyncio
+import datetime
+import json
+import logging
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from ..hrv.hrv_process import hrv_process
+
+logger = logging.getLogger("qskit")
+
+# live ingestion of many concurrent device streams (ECG, PPG, RR) with asyncio
+# each device has a bounded queue: producers awaiting push() are throttled when processing falls behind (backpressure)
+# ready windows of a device are batched into one hrv_process job on a worker pool, so the event loop never blocks
+# per device HRV windows are published to subscribers as dicts, same columns as hrv_process output
+
+def hrv_window_job(signal, sf, type, window, slide, metrics, dts, device, user, n_windows, kwargs):
+    # runs in worker pool: hrv_process over a chunk covering n_windows windows
+    hrv = hrv_process(signal, sf, type = type, window = window, slide = slide, metrics = metrics, dts = dts, user = user, device = device, **kwargs)
+    if hrv is None or len(hrv) == 0:
+        return []
+    # chunk may fit one extra window, it is processed with the next batch
+    hrv = hrv[hrv['ss'] < n_windows * slide * sf]
+    return hrv.to_dict('records')
+
+class HrvStream:
+    # state of one device stream: buffered samples (or RR intervals) not yet covered by processed windows
+    def __init__(self, device, type, sf, window, slide, metrics, user, dts, queue_size, kwargs):
+        self.device = device; self.type = type; self.sf = sf
+        self.window = window; self.slide = slide; self.metrics = metrics
+        self.user = user; self.dts = dts; self.kwargs = kwargs
+        self.queue = asyncio.Queue(maxsize = queue_size)
+        self.buffer = []; self.buffer_len = 0
+        # buffer_start: stream time (samples, ms for RR) of first buffered value
+        self.buffer_start = 0; self.next_window = 0
+        # data needed after last window end: one second used by hrv_process, for RR a few beats
+        self.margin = 3 * sf if type == 'RR' else sf
+        self.task = None
+
+    def time_end(self, values):
+        # stream time covered by values, RR intervals advance time by their duration
+        return np.sum(values) if self.type == 'RR' else len(values)
+
+class HrvHub:
+    def __init__(self, executor = None, max_workers = None, batch_windows = 10, subscriber_queue_size = 1000):
+        self.executor = executor if executor is not None else ProcessPoolExecutor(max_workers = max_workers)
+        self.own_executor = executor is None
+        self.batch_windows = batch_windows
+        self.subscriber_queue_size = subscriber_queue_size
+        self.streams = {}; self.subscribers = []; self.server = None
+
+    def add_device(self, device, type = 'ECG', sf = 512, window = 60, slide = 30, metrics = None, user = 'user', dts = None, queue_size = 100, **kwargs):
+        # register a device stream, kwargs are passed to hrv_process (min_hr, max_hr, psd_method, dtype...)
+        if device in self.streams:
+            raise ValueError(f'device {device} already added')
+        if type == 'RR' and sf != 1000:
+            logger.warning(f'{device}: RR intervals are expected in ms, sf = 1000')
+        if dts is None: dts = datetime.datetime.now()
+        stream = HrvStream(device, type, sf, window, slide, metrics, user, dts, queue_size, kwargs)
+        stream.task = asyncio.get_running_loop().create_task(self.consume(stream))
+        self.streams[device] = stream
+        return stream
+
+    async def push(self, device, values):
+        # add samples (or RR intervals in ms) of a device, waits while the device queue is full
+        await self.streams[device].queue.put(np.asarray(values, dtype = np.float64))
+
+    def subscribe(self, devices = None):
+        # queue receiving (device, hrv window dict), optionally only for selected devices
+        queue = asyncio.Queue(maxsize = self.subscriber_queue_size)
+        self.subscribers.append([queue, devices])
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers = [s for s in self.subscribers if s[0] is not queue]
+
+    def publish(self, device, hrv):
+        for queue, devices in self.subscribers:
+            if devices is not None and device not in devices:
+                continue
+            # slow subscribers lose oldest windows instead of blocking processing of all devices
+            if queue.full():
+                queue.get_nowait()
+                logger.warning(f'{device}: subscriber queue full, dropping oldest window')
+            queue.put_nowait((device, hrv))
+
+    async def consume(self, stream):
+        loop = asyncio.get_running_loop()
+        s_window = stream.window * stream.sf; s_slide = stream.slide * stream.sf
+        closed = False
+        while not closed:
+            values = await stream.queue.get()
+            if values is None:
+                closed = True
+            else:
+                stream.buffer.append(values); stream.buffer_len += stream.time_end(values)
+                # take everything already queued, so that ready windows are batched together
+                while not stream.queue.empty():
+                    values = stream.queue.get_nowait()
+                    if values is None:
+                        closed = True; break
+                    stream.buffer.append(values); stream.buffer_len += stream.time_end(values)
+            # windows fully covered by buffered data
+            buffer_end = stream.buffer_start + stream.buffer_len
+            n_ready = int((buffer_end - stream.margin - s_window - stream.next_window) // s_slide) + 1
+            while n_ready > 0:
+                n = min(n_ready, self.batch_windows)
+                await self.process(loop, stream, n, s_window, s_slide)
+                n_ready -= n
+        logger.info(f'{stream.device}: stream closed')
+
+    async def process(self, loop, stream, n, s_window, s_slide):
+        signal = np.concatenate(stream.buffer)
+        chunk_start = stream.next_window; job_type = stream.type
+        if stream.type == 'RR':
+            # RR are passed as beat times relative to window start, so windows are aligned as in offline hrv_process
+            beats = stream.buffer_start + np.cumsum(np.append(0, signal))
+            chunk_end = stream.next_window + (n - 1) * s_slide + s_window + stream.margin
+            # first beat after chunk end is included, so that hrv_process sees the last window as complete
+            # even when a long RR interval spans the margin
+            chunk = beats[np.searchsorted(beats, stream.next_window):np.searchsorted(beats, chunk_end, side = 'right') + 1] - stream.next_window
+            job_type = 'RPeaks'
+        else:
+            offset = int(stream.next_window - stream.buffer_start)
+            chunk = signal[offset:offset + int((n - 1) * s_slide + s_window + stream.margin)]
+        dts = stream.dts + datetime.timedelta(seconds = chunk_start / stream.sf)
+        try:
+            hrv_all = await loop.run_in_executor(self.executor, hrv_window_job, chunk, stream.sf, job_type, stream.window, stream.slide,
+                                                 stream.metrics, dts, stream.device, stream.user, n, stream.kwargs)
+        except Exception as error:
+            logger.warning(f'{stream.device}: {error}')
+            hrv_all = []
+        for hrv in hrv_all:
+            # window start in stream time
+            hrv['ss'] = hrv['ss'] + chunk_start
+            self.publish(stream.device, hrv)
+        stream.next_window += n * s_slide
+        # drop buffered values before next window
+        if stream.type == 'RR':
+            keep = np.searchsorted(beats, stream.next_window)
+            stream.buffer_start = beats[keep]
+        else:
+            keep = int(stream.next_window - stream.buffer_start)
+            stream.buffer_start = stream.next_window
+        signal = signal[keep:]
+        stream.buffer = [signal]; stream.buffer_len = stream.time_end(signal)
+
+    async def close_device(self, device):
+        # process remaining complete windows and stop device stream
+        stream = self.streams[device]
+        await stream.queue.put(None)
+        await stream.task
+        self.streams.pop(device, None)
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close(); await self.server.wait_closed()
+        for device in list(self.streams.keys()):
+            await self.close_device(device)
+        if self.own_executor:
+            self.executor.shutdown()
+
+    async def serve(self, host = '127.0.0.1', port = 8765):
+        # local socket ingestion: first line is json header with add_device arguments ({"device": "polar", "type": "RR", "sf": 1000, ...}),
+        # next lines are comma separated values, TCP flow control propagates backpressure to the device
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    async def handle_connection(self, reader, writer):
+        device = None
+        try:
+            header = json.loads(await reader.readline())
+            device = header.pop('device')
+            self.add_device(device, **header)
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.strip()
+                if line:
+                    await self.push(device, np.array(line.split(b','), dtype = np.float64))
+        except Exception as error:
+            logger.warning(f'{device}: {error}')
+        finally:
+            writer.close()
+            if device in self.streams:
+                await self.close_device(device)
+
+def hrv_dataframe(hrv_all):
+    # collected subscriber windows as hrv_process like dataframe
+    return pd.DataFrame.from_dict(hrv_all)
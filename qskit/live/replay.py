@@ -0,0 +1,51 @@
+import asyncio
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# file replay stand-in for live devices: feeds recorded CSV / EDF files into HrvHub
+# at real-time (speed = 1) or accelerated speed (speed = 60 is one hour per minute, None is as fast as processing allows)
+
+def load_recording(path, column = None, channel = None):
+    # CSV column (e.g. Movesense 'Count', Polar RR 'duration') or EDF channel (e.g. Hypnodyne ZMax 'OXY_IR_AC')
+    if os.path.splitext(path)[1].lower() == '.edf':
+        import mne
+        raw = mne.io.read_raw_edf(path, verbose = False)
+        if channel is not None: raw.pick([channel])
+        return raw.get_data()[0]
+    data = pd.read_csv(path)
+    return data[column if column is not None else data.columns[0]].to_numpy(dtype = np.float64)
+
+def replay_chunks(values, sf, type = 'ECG', chunk = 1):
+    # split recording into chunks of chunk seconds, RR intervals (ms) are split by their cumulative duration
+    if type == 'RR':
+        edges = np.searchsorted(np.cumsum(values), np.arange(chunk * 1000, np.sum(values) + chunk * 1000, chunk * 1000), side = 'right')
+    else:
+        edges = np.arange(int(chunk * sf), len(values) + int(chunk * sf), int(chunk * sf))
+    return [c for c in np.split(values, edges) if len(c) > 0]
+
+async def replay_file(hub, device, path, sf, type = 'ECG', column = None, channel = None, speed = 1, chunk = 1, **kwargs):
+    # replay a recording into hub as device, kwargs are passed to hub.add_device
+    values = load_recording(path, column, channel)
+    hub.add_device(device, type = type, sf = sf, **kwargs)
+    for values_chunk in replay_chunks(values, sf, type, chunk):
+        await hub.push(device, values_chunk)
+        if speed is not None:
+            await asyncio.sleep((np.sum(values_chunk) / 1000 if type == 'RR' else len(values_chunk) / sf) / speed)
+    await hub.close_device(device)
+
+async def replay_socket(device, path, sf, type = 'ECG', column = None, channel = None, speed = 1, chunk = 1, host = '127.0.0.1', port = 8765, **kwargs):
+    # replay a recording to hub.serve() socket, kwargs are sent in header and passed to hub.add_device
+    values = load_recording(path, column, channel)
+    reader, writer = await asyncio.open_connection(host, port)
+    header = {'device': device, 'type': type, 'sf': sf}; header.update(kwargs)
+    writer.write((json.dumps(header) + '\n').encode())
+    for values_chunk in replay_chunks(values, sf, type, chunk):
+        writer.write((','.join(map(repr, values_chunk.tolist())) + '\n').encode())
+        # waits while socket buffers are full, i.e. hub applies backpressure
+        await writer.drain()
+        if speed is not None:
+            await asyncio.sleep((np.sum(values_chunk) / 1000 if type == 'RR' else len(values_chunk) / sf) / speed)
+    writer.close()
+    await writer.wait_closed()
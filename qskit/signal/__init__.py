@@ -11,4 +11,7 @@ from .signal import (
     sc_interp,
     sc_interp1d,
     sc_interp1d_nan
-)
\ No newline at end of file
+)
+from .interp import interp_single, interp_brackets, nearest_indices
+from .ecg import signal_decimate, peaks_refine, ecg_lead_peaks, ecg_clean_channels, peaks_fuse
+from .ppg import ppg_findpeaks, ppg_findtroughs
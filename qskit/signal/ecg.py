@@ -0,0 +1,115 @@
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+from fractions import Fraction
+from scipy.signal import resample_poly, butter, sosfiltfilt, filtfilt
+
+logger = logging.getLogger("qskit")
+
+# QRS detection on a decimated signal with refinement of peaks back to the full rate signal
+# detection cost drops by roughly the decimation factor, R-peak timing precision is kept by
+# local search of the maximum on the full rate signal and parabolic interpolation around it
+# https://www.samproell.io/posts/signal/ecg-library-comparison/
+
+def signal_decimate(signal, sf, detect_sf):
+    # anti-alias (polyphase FIR) decimation to detect_sf, works for non integer ratios (e.g. 512 -> 250 Hz)
+    # 2d signals (channels x samples) are decimated along samples
+    ratio = Fraction(detect_sf / sf).limit_denominator(1000)
+    decimated = resample_poly(np.asarray(signal, dtype = np.float64), ratio.numerator, ratio.denominator, axis = -1)
+    # effective rate of the decimated signal
+    return decimated, sf * ratio.numerator / ratio.denominator
+
+def peaks_refine(signal, peaks, radius, subsample = True):
+    # move approximate peak positions (full rate samples, e.g. scaled from decimated detection) to the maximum
+    # of full rate signal within radius samples, optionally with sub-sample precision
+    # from parabola fitted to the maximum and its neighbours
+    peaks = np.asarray(peaks)
+    if len(peaks) == 0:
+        return peaks.astype(np.float64)
+    centers = np.round(peaks).astype(int)
+    candidates = np.clip(centers[:, np.newaxis] + np.arange(-radius, radius + 1), 0, len(signal) - 1)
+    refined = candidates[np.arange(len(peaks)), np.argmax(signal[candidates], axis = 1)]
+    if not subsample:
+        return refined
+    inner = (refined > 0) & (refined < len(signal) - 1)
+    y0, y1, y2 = [np.asarray(signal[np.clip(refined + i, 0, len(signal) - 1)], dtype = np.float64) for i in [-1, 0, 1]]
+    denominator = y0 - 2 * y1 + y2
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        shift = np.where(inner & (denominator < 0), 0.5 * (y0 - y2) / denominator, 0)
+    return refined + np.clip(shift, -0.5, 0.5)
+
+def ecg_lead_peaks(lead_clean, sf, lead_detect = None, detect_sf = None):
+    # R-peaks of one cleaned lead over the whole recording, optionally detected on decimated lead and refined
+    try:
+        if lead_detect is None:
+            peaks = nk.ecg_findpeaks(lead_clean, sampling_rate=sf, method='neurokit')['ECG_R_Peaks']
+        else:
+            peaks = nk.ecg_findpeaks(lead_detect, sampling_rate=detect_sf, method='neurokit')['ECG_R_Peaks']
+            peaks = peaks_refine(lead_clean, peaks * sf / detect_sf, int(np.ceil(2 * sf / detect_sf)))
+    except Exception as error:
+        logger.warning(error)
+        peaks = []
+    return np.asarray(peaks, dtype = np.float64)
+
+def ecg_clean_channels(signal, sf, powerline = 50, dtype = None, chunk = 600, margin = 30):
+    # neurokit ECG cleaning (nk.ecg_clean method = 'neurokit') of all channels at once (channels x samples):
+    # 0.5 Hz highpass butterworth (order 5, zero phase) and powerline moving average, same output as per channel nk.ecg_clean
+    # with dtype (e.g. np.float32) the signal is cleaned in float64 chunks of chunk seconds overlapping by margin seconds,
+    # written into a dtype output, so float64 temporaries are bounded by chunk length instead of recording length
+    if dtype is not None:
+        return ecg_clean_chunks(signal, sf, powerline, dtype, chunk, margin)
+    signal = np.atleast_2d(np.asarray(signal, dtype = np.float64))
+    if np.isnan(signal).any():
+        # missing values are forward filled as in nk.ecg_clean
+        signal = pd.DataFrame(signal.T).ffill().to_numpy().T
+    sos = butter(5, 0.5, btype = 'highpass', output = 'sos', fs = sf)
+    clean = sosfiltfilt(sos, signal, axis = -1)
+    b = np.ones(int(sf / powerline)) if sf >= 100 else np.ones(2)
+    return filtfilt(b, [len(b)], clean, method = 'pad', axis = -1)
+
+def ecg_clean_chunks(signal, sf, powerline = 50, dtype = np.float32, chunk = 600, margin = 30):
+    # zero phase filter transients decay within margin (0.5 Hz highpass settles in a few seconds),
+    # so chunk cores match whole signal cleaning to far below float32 resolution
+    signal = np.atleast_2d(np.asarray(signal))
+    if np.isnan(signal).any():
+        # forward fill over the whole signal, so that gaps crossing chunk borders are filled as in nk.ecg_clean
+        signal = pd.DataFrame(signal.T).ffill().to_numpy().T
+    n = signal.shape[-1]; chunk_len = int(chunk * sf); margin_len = int(margin * sf)
+    clean = np.empty(signal.shape, dtype = dtype)
+    for cs in range(0, n, chunk_len):
+        ce = min(cs + chunk_len, n)
+        ms = max(cs - margin_len, 0); me = min(ce + margin_len, n)
+        clean[:, cs:ce] = ecg_clean_channels(signal[:, ms:me], sf, powerline)[:, cs - ms:ce - ms]
+    return clean
+
+def peaks_fuse(peaks, lead, sf, tolerance = 0.1, votes = None):
+    # fused beats of several leads (list of peak arrays, samples) by cross-lead voting:
+    # peaks of all leads within tolerance (s) are one beat, beats detected by a majority of leads are kept,
+    # beats of the best lead (e.g. by beats_cor_sqi) need half of leads, so with 2 leads the best lead decides.
+    # beat times are taken from the best lead, beats it missed get the median of other leads,
+    # shifted by their median offset to the best lead (R-peak timing differs between leads)
+    n = len(peaks)
+    if votes is None: votes = n // 2 + 1
+    times = np.concatenate([np.asarray(p, dtype = np.float64) for p in peaks])
+    leads = np.concatenate([np.full(len(p), c) for c, p in enumerate(peaks)])
+    if len(times) == 0:
+        return times
+    order = np.argsort(times, kind = 'stable'); times = times[order]; leads = leads[order]
+    beat = np.append(0, np.cumsum(np.diff(times) > tolerance * sf))
+    n_beats = beat[-1] + 1
+    # leads voting for each beat, a lead counts once per beat
+    voted = np.zeros((n_beats, n), dtype = bool); voted[beat, leads] = True
+    n_votes = voted.sum(axis = 1)
+    keep = (n_votes >= votes) | (voted[:, lead] & (n_votes >= (n + 1) // 2))
+    # first peak of each lead in each beat (reversed, so that the earliest peak is assigned last)
+    first = np.full((n_beats, n), np.nan)
+    first[beat[::-1], leads[::-1]] = times[::-1]
+    with warnings.catch_warnings():
+        # leads without beats shared with the best lead have no offset
+        warnings.simplefilter('ignore', RuntimeWarning)
+        offsets = np.nan_to_num(np.nanmedian(first - first[:, [lead]], axis = 0))
+        shifted = np.nanmedian(first - offsets, axis = 1)
+    fused = np.where(voted[:, lead], first[:, lead], shifted)
+    return fused[keep]
@@ -0,0 +1,141 @@
+import numpy as np
+from functools import lru_cache, partial
+from scipy.interpolate import CubicSpline, PchipInterpolator, Akima1DInterpolator
+
+# interpolation engine behind sc_interp1d / sc_interp / sc_interp1d_nan: linear and pchip use a numpy fast path
+# with precomputed bracket indices (cached for uniform grids) and evaluation into a preallocated output,
+# other methods use scipy interpolators. Knots are addressed with row offsets, so slopes and brackets work on
+# several series flattened into one array
+
+interp_fast = ['pchip', 'linear', 'sc_linear']
+interp_scipy = {
+    'akima': Akima1DInterpolator,
+    'pchip': PchipInterpolator,
+    'cubic': CubicSpline,
+    'natural': partial(CubicSpline, bc_type = 'natural'),
+}
+
+def interp_brackets(x, offsets, new_x, new_offsets):
+    # flat index of left knot of the interval containing each target,
+    # targets out of range get first / last interval of their series, -1 for series with < 2 points
+    k = np.empty(len(new_x), dtype = np.int64)
+    for r in range(len(offsets) - 1):
+        xs = x[offsets[r]:offsets[r + 1]]; ts = new_x[new_offsets[r]:new_offsets[r + 1]]
+        if len(xs) < 2:
+            k[new_offsets[r]:new_offsets[r + 1]] = -1
+            continue
+        if len(ts) > 1 and np.all(ts[1:] >= ts[:-1]):
+            # sorted targets (e.g. linspace grids): locate knots in targets and expand, O(n log m) instead of O(m log n)
+            p = np.searchsorted(ts, xs[1:-1], side = 'left')
+            kr = np.repeat(np.arange(len(xs) - 1), np.diff(np.concatenate(([0], p, [len(ts)]))))
+        else:
+            kr = np.clip(np.searchsorted(xs, ts, side = 'right') - 1, 0, len(xs) - 2)
+        k[new_offsets[r]:new_offsets[r + 1]] = kr + offsets[r]
+    return k
+
+@lru_cache(maxsize = 64)
+def uniform_brackets(n, desired_len):
+    # brackets of np.linspace(0, n-1, desired_len) on the integer grid np.arange(n), cached for repeated calls
+    x = np.arange(n, dtype = np.float64); new_x = np.linspace(0, n - 1, desired_len)
+    k = interp_brackets(x, np.array([0, n]), new_x, np.array([0, desired_len]))
+    k.setflags(write = False)
+    return k
+
+def pchip_slopes(x, y, offsets):
+    # pchip derivatives for all flattened series, same algorithm as scipy PchipInterpolator
+    # https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.PchipInterpolator.html
+    d = np.zeros(len(x))
+    if len(x) < 2:
+        return d
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        h = np.diff(x); m = np.diff(y) / h
+        # interior points: weighted harmonic mean of neighbouring slopes, 0 at local extrema
+        w1 = 2 * h[1:] + h[:-1]; w2 = h[1:] + 2 * h[:-1]
+        m0 = m[:-1]; m1 = m[1:]
+        condition = (np.sign(m0) != np.sign(m1)) | (m0 == 0) | (m1 == 0)
+        d[1:-1] = np.where(condition, 0, (w1 + w2) / (w1 / m0 + w2 / m1))
+        starts = offsets[:-1]; ends = offsets[1:] - 1; lengths = ends - starts + 1
+        two = lengths == 2; edge = lengths > 2
+        d[starts[two]] = m[starts[two]]; d[ends[two]] = m[starts[two]]
+        s = starts[edge]; e = ends[edge]
+        d[s] = pchip_edge(h[s], h[s + 1], m[s], m[s + 1])
+        d[e] = pchip_edge(h[e - 1], h[e - 2], m[e - 1], m[e - 2])
+    return d
+
+def pchip_edge(h0, h1, m0, m1):
+    # one sided three point estimate, shape preserving
+    d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    d = np.where(np.sign(d) != np.sign(m0), 0, d)
+    return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(d) > np.abs(3 * m0)), 3 * m0, d)
+
+def interp_coefficients(x, y, m = 'pchip', d = None):
+    # polynomial coefficients of each interval in normalized position t = (x - x_k) / h_k, highest power first
+    # c3, c2, c1, c0 for pchip (cubic hermite), c1, c0 for linear, intervals between series are unused
+    # returned with inverse interval width, used to compute t
+    h = np.diff(x); dy = np.diff(y)
+    with np.errstate(divide = 'ignore'):
+        inv_h = 1 / h
+    if m == 'pchip':
+        d0 = d[:-1] * h; d1 = d[1:] * h
+        return inv_h, [d0 + d1 - 2 * dy, 3 * dy - 2 * d0 - d1, d0, y[:-1]]
+    return inv_h, [dy, y[:-1]]
+
+def interp_eval(x, y, new_x, k, m = 'pchip', d = None, extrapolate = True, out = None, coefficients = None, block = 2**15):
+    # evaluate flattened series at flattened targets with precomputed brackets k, result is written to out
+    # targets are evaluated in blocks, so that temporaries stay in cpu cache
+    if out is None: out = np.empty(len(new_x))
+    if len(x) < 2:
+        out[:] = np.nan
+        return out
+    if coefficients is None:
+        coefficients = interp_coefficients(x, y, m = m, d = d)
+    inv_h, c = coefficients
+    # lower precision out (e.g. float32) is filled from a float64 block buffer, so horner scheme stays in float64
+    buffer = None if out.dtype == np.float64 else np.empty(min(block, len(new_x)))
+    for bs in range(0, len(new_x), block):
+        be = min(bs + block, len(new_x))
+        if buffer is None:
+            interp_eval_block(x, inv_h, c, new_x[bs:be], k[bs:be], extrapolate, out[bs:be])
+        else:
+            interp_eval_block(x, inv_h, c, new_x[bs:be], k[bs:be], extrapolate, buffer[:be - bs])
+            out[bs:be] = buffer[:be - bs]
+    return out
+
+def interp_eval_block(x, inv_h, c, new_x, k, extrapolate, out):
+    # out of range targets are extrapolated with first / last interval polynomial, as scipy does
+    short = k < 0
+    if short.any():
+        kk = np.where(short, 0, k)
+    else:
+        kk = k
+    if not short.any() and np.all(kk[1:] >= kk[:-1]):
+        # sorted targets: interval values are expanded with repeat, much cheaper than gathering
+        k0 = kk[0]; counts = np.bincount(kk - k0)
+        gather = lambda v: np.repeat(v[k0:k0 + len(counts)], counts)
+    else:
+        # brackets are always valid indices, mode clip skips bounds checking
+        gather = lambda v: np.take(v, kk, mode = 'clip')
+    # t is the position within interval, horner scheme accumulates in out
+    x0 = gather(x)
+    t = new_x - x0; t *= gather(inv_h)
+    out[:] = gather(c[0])
+    for ci in c[1:]:
+        out *= t; out += gather(ci)
+    if not extrapolate:
+        out[(new_x < x0) | (new_x > gather(x[1:]))] = np.nan
+    out[short] = np.nan
+
+def interp_single(x, y, new_x, m = 'pchip', extrapolate = True, brackets = None, out = None):
+    # single series fast path without flattening / padding, result is written to out if given
+    x = np.asarray(x, dtype = np.float64); y = np.asarray(y, dtype = np.float64); new_x = np.asarray(new_x, dtype = np.float64)
+    offsets = np.array([0, len(x)]); t_offsets = np.array([0, len(new_x)])
+    if brackets is None:
+        brackets = interp_brackets(x, offsets, new_x, t_offsets)
+    d = pchip_slopes(x, y, offsets) if m == 'pchip' else None
+    return interp_eval(x, y, new_x, brackets, m = m, d = d, extrapolate = extrapolate and m != 'sc_linear', out = out)
+
+def nearest_indices(grid, values):
+    # index of nearest grid point for each value on a sorted grid, first index on ties (as argmin)
+    i = np.clip(np.searchsorted(grid, values), 1, len(grid) - 1)
+    left = grid[i - 1]; right = grid[i]
+    return np.where(values - left <= right - values, i - 1, i)
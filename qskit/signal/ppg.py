@@ -0,0 +1,76 @@
+import numpy as np
+
+# PPG systolic peak & trough detection with adaptive threshold, vectorized version of
+# vital_sqi PeakDetector.ppg_detector(detector_type=1) which runs once over the whole signal
+# Systolic Peak Detection in Acceleration Photoplethysmograms Measured from Emergency Responders in Tropical Conditions
+# https://journals.plos.org/plosone/article?id=10.1371/journal.pone.0076585
+
+def moving_average(signal, w):
+    # centered moving average with edge padding, same as vital_sqi get_moving_average, via cumsum in float64
+    padded = np.pad(np.asarray(signal, dtype = np.float64), (w // 2, w - 1 - w // 2), mode = 'edge')
+    csum = np.cumsum(np.append(0, padded))
+    return (csum[w:] - csum[:-w]) / w
+
+def local_extrema(signal, maxima = True):
+    # first sample of each local maximum (minimum) plateau
+    d = np.diff(signal) if maxima else -np.diff(signal)
+    return np.where((d[:-1] > 0) & (d[1:] <= 0))[0] + 1
+
+def group_argmax(values, idx, groups):
+    # index of max value within each group, earliest index for ties (as np.argmax)
+    order = np.lexsort((idx, -values, groups))
+    first = np.append(True, groups[order][1:] != groups[order][:-1])
+    return idx[order][first]
+
+def ppg_findpeaks_chunk(signal, sf, adaptive_size = 0.75):
+    # regions of interest (ROI) are where signal is above its moving average (adaptive threshold)
+    # peak is the maximum of each ROI
+    adaptive_threshold = moving_average(signal, int(adaptive_size * sf * 2 + 1))
+    d = signal - adaptive_threshold
+    starts = np.where((d[:-1] < 0) & (d[1:] > 0))[0]
+    ends = np.where((d[:-1] > 0) & (d[1:] < 0))[0]
+    if len(starts) == 0:
+        return np.array([], dtype = int)
+    # each ROI ends at first downward crossing after its start, or at signal end
+    ends_i = np.searchsorted(ends, starts)
+    ends = np.append(ends, len(signal) - 1)[ends_i]
+    # ROI maximum is either at local maximum inside ROI or at ROI boundary
+    candidates = np.unique(np.concatenate((local_extrema(signal), starts, ends)))
+    roi = np.searchsorted(starts, candidates, side = 'right') - 1
+    inside = (roi >= 0) & (candidates <= ends[np.maximum(roi, 0)])
+    return group_argmax(signal[candidates[inside]], candidates[inside], roi[inside])
+
+def ppg_findpeaks(signal, sf, adaptive_size = 0.75, chunk = 600, margin = 10, troughs = True):
+    # detect peaks over the whole signal in chunks of chunk seconds,
+    # chunks overlap by margin seconds so that ROIs crossing chunk borders are complete
+    # returns peaks and troughs (None when troughs = False, e.g. hrv_process only uses peaks)
+    signal = np.asarray(signal)
+    chunk_len = int(chunk * sf); margin_len = int(margin * sf)
+    peaks = []; minima = []
+    for cs in range(0, len(signal), chunk_len):
+        ce = min(cs + chunk_len, len(signal))
+        ms = max(cs - margin_len, 0); me = min(ce + margin_len, len(signal))
+        chunk_peaks = ppg_findpeaks_chunk(signal[ms:me], sf, adaptive_size) + ms
+        peaks.append(chunk_peaks[(chunk_peaks >= cs) & (chunk_peaks < ce)])
+        if troughs:
+            # local minima of chunk core, with one sample context on each side
+            ls = max(cs - 1, 0)
+            chunk_minima = local_extrema(signal[ls:min(ce + 1, len(signal))], maxima = False) + ls
+            minima.append(chunk_minima)
+    peaks = np.concatenate(peaks) if len(peaks) > 0 else np.array([], dtype = int)
+    if not troughs:
+        return peaks, None
+    minima = np.concatenate(minima) if len(minima) > 0 else np.array([], dtype = int)
+    return peaks, ppg_findtroughs(signal, peaks, minima)
+
+def ppg_findtroughs(signal, peaks, minima = None):
+    # trough is the minimum between consecutive peaks
+    if len(peaks) < 2:
+        return np.array([], dtype = int)
+    if minima is None:
+        minima = local_extrema(signal, maxima = False)
+    candidates = np.unique(np.concatenate((minima, peaks[:-1])))
+    beat = np.searchsorted(peaks, candidates, side = 'right') - 1
+    inside = (beat >= 0) & (beat < len(peaks) - 1)
+    inside[inside] = candidates[inside] < peaks[beat[inside] + 1]
+    return group_argmax(-signal[candidates[inside]], candidates[inside], beat[inside])
@@ -25,20 +25,30 @@ def butter_highpass(lowcut, fs, order=5):
     b, a = butter(order, low, btype='highpass')
     return b, a
 
-def butter_bandpass_filter(data, lowcut, highcut, fs, order=3):
-    b, a = butter_bandpass(lowcut, highcut, fs, order=order)
-    y = lfilter(b, a, data)
+# filters run in float64, as transfer function (b, a) IIR filters with low cutoffs are unstable in float32.
+# with dtype (e.g. np.float32 for long recordings) the causal filter runs over chunks with its state carried
+# between chunks, so the dtype output is the only full length array and float64 temporaries stay chunk sized
+def butter_filter(b, a, data, dtype=None, chunk=2**20):
+    if dtype is None:
+        return lfilter(b, a, data)
+    data = np.asarray(data)
+    y = np.empty(len(data), dtype=dtype)
+    z = np.zeros(max(len(a), len(b)) - 1)
+    for s in range(0, len(data), chunk):
+        y[s:s + chunk], z = lfilter(b, a, data[s:s + chunk], zi=z)
     return y
+
+def butter_bandpass_filter(data, lowcut, highcut, fs, order=3, dtype=None):
+    b, a = butter_bandpass(lowcut, highcut, fs, order=order)
+    return butter_filter(b, a, data, dtype=dtype)
   
-def butter_lowpass_filter(data, highcut, fs, order=3):
+def butter_lowpass_filter(data, highcut, fs, order=3, dtype=None):
     b, a = butter_lowpass(highcut, fs, order=order)
-    y = lfilter(b, a, data)
-    return y
+    return butter_filter(b, a, data, dtype=dtype)
   
-def butter_highpass_filter(data, lowcut, fs, order=3):
+def butter_highpass_filter(data, lowcut, fs, order=3, dtype=None):
     b, a = butter_highpass(lowcut, fs, order=order)
-    y = lfilter(b, a, data)
-    return y
+    return butter_filter(b, a, data, dtype=dtype)
 
 import matplotlib.pyplot as plt
 def butter_bandpass_plot(lowcut, highcut, fs, order_f):
@@ -60,41 +70,31 @@ def butter_bandpass_plot(lowcut, highcut, fs, order_f):
     b, a = butter_bandpass(lowcut, highcut, fs, order=order_f)
     return([b, a])
 
-from scipy.interpolate import interp1d, CubicSpline, PchipInterpolator, Akima1DInterpolator
-def sc_interp1d(x, y, desired_len, m = 'pchip'):
+from scipy.interpolate import interp1d
+from .interp import interp_fast, interp_scipy, interp_single, uniform_brackets
+# thin wrappers over the batched interpolation engine in interp.py, pchip & linear use its fast path
+def sc_interp1d(x, y, desired_len, m = 'pchip', dtype = None):
   new_x = np.linspace(x[0], x[-1], desired_len)
-  if m == 'akima':
-    akima_interp = Akima1DInterpolator(x, y)
-    new_y = akima_interp(new_x)
-  elif m == 'pchip':
-    pchip_interp = PchipInterpolator(x, y)
-    new_y = pchip_interp(new_x)
-  elif m == 'cubic':
-    cubic_interp = CubicSpline(x, y)
-    new_y = cubic_interp(new_x)
-  elif m == 'natural':
-    cubic_interp = CubicSpline(x, y, bc_type='natural')
-    new_y = cubic_interp(new_x)
+  if m in interp_fast:
+    # evaluated in float64 blocks and written straight into a dtype output
+    new_y = interp_single(x, y, new_x, m = m, out = None if dtype is None else np.empty(desired_len, dtype = dtype))
+  elif m in interp_scipy:
+    new_y = interp_scipy[m](x, y)(new_x)
   else:
     new_y = sp.interpolate.interp1d(x, y, kind=m)(new_x)
+  # new_x stays float64: timestamps of long recordings exceed float32 integer precision
+  if dtype is not None: new_y = new_y.astype(dtype, copy=False)
   return([new_x, new_y])
 
 def sc_interp(y, desired_len, m = 'pchip'):
   y = np.array(y)
   x = np.arange(len(y))
   new_x = np.linspace(x[0], x[-1], desired_len)
-  if m == 'akima':
-    akima_interp = Akima1DInterpolator(x, y)
-    new_y = akima_interp(new_x)
-  elif m == 'pchip':
-    pchip_interp = PchipInterpolator(x, y)
-    new_y = pchip_interp(new_x)
-  elif m == 'cubic':
-    cubic_interp = CubicSpline(x, y)
-    new_y = cubic_interp(new_x)
-  elif m == 'natural':
-    cubic_interp = CubicSpline(x, y, bc_type='natural')
-    new_y = cubic_interp(new_x)
+  if m in interp_fast:
+    # brackets of the uniform grid only depend on lengths and are cached
+    new_y = interp_single(x, y, new_x, m = m, brackets = uniform_brackets(len(y), desired_len))
+  elif m in interp_scipy:
+    new_y = interp_scipy[m](x, y)(new_x)
   else:
     new_y = sp.interpolate.interp1d(x, y, kind=m)(new_x)
   return(new_y)
@@ -103,23 +103,12 @@ def sc_interp1d_nan(y, m = 'pchip', extrapolate = False):
   y = np.array(y)
   x = np.arange(len(y))
   nan_indices = np.isnan(y); y_interp = []
-  if m == 'akima':
-    akima_interp = Akima1DInterpolator(x[~nan_indices], y[~nan_indices])
-    y_interp = akima_interp(x, extrapolate = extrapolate)
-  elif m == 'pchip':
-    pchip_interp = PchipInterpolator(x[~nan_indices], y[~nan_indices])
-    y_interp = pchip_interp(x, extrapolate = extrapolate)
-  elif m == 'cubic':
-    cubic_interp = CubicSpline(x[~nan_indices], y[~nan_indices])
-    y_interp = cubic_interp(x, extrapolate = extrapolate)
-  elif m == 'natural':
-    cubic_interp = CubicSpline(x[~nan_indices], y[~nan_indices], bc_type = 'natural')
-    y_interp = cubic_interp(x, extrapolate = extrapolate)
+  if m in interp_fast:
+    y_interp = interp_single(x[~nan_indices], y[~nan_indices], x, m = m, extrapolate = extrapolate and m == 'pchip')
+  elif m in interp_scipy:
+    y_interp = interp_scipy[m](x[~nan_indices], y[~nan_indices])(x, extrapolate = extrapolate)
   elif m == 'np_linear':
     y_interp = np.interp(x, x[~nan_indices], y[~nan_indices])
-  elif m == 'sc_linear':
-    f = interp1d(x[~nan_indices], y[~nan_indices], bounds_error=False, kind='linear',assume_sorted=True,copy=False)
-    y_interp = f(np.arange(y.shape[0]))
   else:
     f = interp1d(x[~nan_indices], y[~nan_indices], bounds_error=False, kind=m,assume_sorted=True,copy=False)
     y_interp = f(np.arange(y.shape[0]))
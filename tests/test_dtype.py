@@ -0,0 +1,48 @@
+import numpy as np
+import neurokit2 as nk
+from qskit.signal import ecg_clean_channels, butter_bandpass_filter, sc_interp1d
+from qskit.hrv import hrv_process
+
+# float32 processing (dtype option) against float64 path on simulated 512 Hz ECG
+
+sf = 512
+ecg = nk.ecg_simulate(duration = 300, sampling_rate = sf, random_state = 3)
+
+def test_filters_chunked():
+    # causal filter over chunks with carried state is the same filter, float32 only rounds its output
+    y = butter_bandpass_filter(ecg, .4, 4, sf, 4)
+    np.testing.assert_allclose(butter_bandpass_filter(ecg, .4, 4, sf, 4, dtype = np.float64), y, rtol = 0, atol = 1e-12)
+    y32 = butter_bandpass_filter(ecg, .4, 4, sf, 4, dtype = np.float32)
+    assert y32.dtype == np.float32
+    np.testing.assert_allclose(y32, y, rtol = 0, atol = 1e-6 * np.abs(y).max())
+
+def test_ecg_clean_chunks():
+    clean = nk.ecg_clean(ecg, sf, method = 'neurokit')
+    clean32 = ecg_clean_channels(ecg, sf, dtype = np.float32, chunk = 60)[0]
+    assert clean32.dtype == np.float32
+    np.testing.assert_allclose(clean32, clean, rtol = 0, atol = 1e-6 * np.abs(clean).max())
+
+def test_interp_float32_out():
+    x = np.cumsum(np.random.default_rng(0).uniform(800, 1200, 60))
+    y = np.random.default_rng(1).uniform(800, 1200, 60)
+    x64, y64 = sc_interp1d(x, y, desired_len = 50000)
+    x32, y32 = sc_interp1d(x, y, desired_len = 50000, dtype = np.float32)
+    assert x32.dtype == np.float64 and y32.dtype == np.float32
+    np.testing.assert_array_equal(y32, y64.astype(np.float32))
+
+# max absolute deviation of float32 from float64 metrics, far below physiological resolution
+deviation_bounds = {
+    'rmssd': 1e-3, 'sdnn': 1e-3, 'sd1': 1e-3, 'sd2': 1e-3,
+    'hf': 1e-2, 'lf': 1e-2, 'ex_hf_power': 1e-2, 'ex_hf_peak_power': 0.1,
+    'lfn': 1e-5, 'hfn': 1e-5, 'dfa_alpha1': 1e-5, 'r_rr': 1e-5, 'bsi': 0.05, 'ans': 1e-3,
+}
+
+def test_float32_metrics():
+    metrics = ['time','freq','bsi','ans','r_rr', 'nl','pwr']
+    hrv64 = hrv_process(ecg, sf = sf, window = 60, slide = 30, metrics = metrics)
+    hrv32 = hrv_process(ecg, sf = sf, window = 60, slide = 30, metrics = metrics, dtype = np.float32)
+    assert len(hrv32) == len(hrv64)
+    for col in ['ss', 'artifacts_n', 'hr_60s', 'meannn_60s', 'ex_hf_peak_freq_60s']:
+        np.testing.assert_array_equal(hrv32[col].values, hrv64[col].values)
+    for metric, bound in deviation_bounds.items():
+        assert np.abs(hrv32[f'{metric}_60s'] - hrv64[f'{metric}_60s']).max() < bound, metric
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import neurokit2 as nk
+import pytest
+from qskit.hrv import hrv_process
+
+# multi-channel ECG: best lead selection and fused beats against clean single lead
+
+@pytest.mark.parametrize('detect_sf', [None, 250])
+def test_fused_beats_artifacts(detect_sf):
+    sf = 1000
+    ecg = nk.ecg_simulate(duration = 300, sampling_rate = sf, random_state = 1, noise = 0.02, heart_rate = 65)
+    rng = np.random.default_rng(0)
+    leads = np.vstack([ecg, 0.7 * np.roll(ecg, 3) + rng.normal(0, .03, len(ecg)), 0.9 * np.roll(ecg, -2) + rng.normal(0, .03, len(ecg))])
+    # heavy noise on first lead in the middle of recording
+    leads[0, 100 * sf:200 * sf] += rng.normal(0, 1.5, 100 * sf)
+    hrv_ref = hrv_process(ecg, sf = sf, window = 60, slide = 30, metrics = ['time'])
+    hrv = hrv_process(leads, sf = sf, window = 60, slide = 30, metrics = ['time'], detect_sf = detect_sf)
+    assert len(hrv) == len(hrv_ref)
+    noisy = (hrv['ss'] + 60 * sf > 100 * sf) & (hrv['ss'] < 200 * sf)
+    assert (hrv.loc[noisy, 'lead'] != 0).all()
+    np.testing.assert_array_equal(hrv['artifacts_n'].values, hrv_ref['artifacts_n'].values)
+    np.testing.assert_allclose(hrv['rmssd_60s'].values, hrv_ref['rmssd_60s'].values, atol = 0.5)
+
+def test_samples_by_channels():
+    # samples x channels input is transposed to channels x samples
+    sf = 500
+    ecg = nk.ecg_simulate(duration = 120, sampling_rate = sf, random_state = 2, heart_rate = 70)
+    leads = np.vstack([ecg, 0.8 * np.roll(ecg, 2)])
+    hrv = hrv_process(leads, sf = sf, window = 60, slide = 30, metrics = ['time'])
+    hrv_t = hrv_process(leads.T, sf = sf, window = 60, slide = 30, metrics = ['time'])
+    assert len(hrv) > 0
+    pd.testing.assert_frame_equal(hrv_t.drop(columns = 'dt'), hrv.drop(columns = 'dt'))
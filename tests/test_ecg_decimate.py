@@ -0,0 +1,29 @@
+import numpy as np
+import neurokit2 as nk
+import pytest
+from qskit.signal import signal_decimate, ecg_lead_peaks
+from qskit.hrv import hrv_process
+
+# decimated QRS detection (detect_sf) against full rate detection on simulated high rate ECG
+
+@pytest.mark.parametrize('sf', [1000, 1024, 3000])
+def test_refined_peaks_match_full_rate(sf):
+    ecg = nk.ecg_simulate(duration = 120, sampling_rate = sf, random_state = 7, heart_rate = 70)
+    ecg_clean = nk.ecg_clean(ecg, sf, method = 'neurokit')
+    peaks = np.asarray(nk.ecg_findpeaks(ecg_clean, sampling_rate = sf, method = 'neurokit')['ECG_R_Peaks'])
+    ecg_detect, detect_sf = signal_decimate(ecg_clean, sf, 250)
+    peaks_refined = ecg_lead_peaks(ecg_clean, sf, ecg_detect, detect_sf)
+    assert len(peaks_refined) == len(peaks)
+    # refined peaks are at the same samples, sub-sample shift is within half a sample
+    np.testing.assert_array_equal(np.round(peaks_refined).astype(int), peaks)
+    rr_diff = np.abs(np.diff(peaks_refined) - np.diff(peaks)) * 1000 / sf
+    assert rr_diff.max() < 1
+
+@pytest.mark.parametrize('sf', [1000, 3000])
+def test_artifacts_unchanged(sf):
+    ecg = nk.ecg_simulate(duration = 300, sampling_rate = sf, random_state = 7, heart_rate = 70)
+    hrv = hrv_process(ecg, sf = sf, window = 60, slide = 30, metrics = ['time'])
+    hrv_detect = hrv_process(ecg, sf = sf, window = 60, slide = 30, metrics = ['time'], detect_sf = 250)
+    assert hrv_detect['artifacts_n'].tolist() == hrv['artifacts_n'].tolist()
+    assert hrv_detect['artifacts_rate'].max() < 0.1
+    np.testing.assert_allclose(hrv_detect['rmssd_60s'], hrv['rmssd_60s'], atol = 0.5)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from scipy.interpolate import PchipInterpolator, interp1d
+from qskit.signal import sc_interp1d, sc_interp, sc_interp1d_nan, interp_single
+
+# numpy pchip / linear fast path against scipy PchipInterpolator and interp1d
+
+rng = np.random.default_rng(0)
+# RR like series: beat times (ms) and RR values with flat steps and local extrema
+x = np.cumsum(rng.uniform(600, 1200, 80))
+y = rng.uniform(600, 1200, 80); y[10:13] = y[10]
+
+def test_sc_interp1d():
+    new_x, new_y = sc_interp1d(x, y, desired_len = 50000)
+    np.testing.assert_allclose(new_y, PchipInterpolator(x, y)(new_x), rtol = 1e-12)
+    new_x, new_y = sc_interp1d(x, y, desired_len = 50000, m = 'linear')
+    np.testing.assert_allclose(new_y, interp1d(x, y)(new_x), rtol = 1e-12)
+
+def test_sc_interp_uniform():
+    # brackets of the uniform grid come from cache on second call
+    for i in range(2):
+        new_y = sc_interp(y, 1000)
+        np.testing.assert_allclose(new_y, PchipInterpolator(np.arange(len(y)), y)(np.linspace(0, len(y) - 1, 1000)), rtol = 1e-12)
+
+@pytest.mark.parametrize('m', ['pchip', 'linear'])
+def test_unsorted_targets_extrapolate(m):
+    new_x = rng.uniform(x[0] - 2000, x[-1] + 2000, 5000)
+    expected = PchipInterpolator(x, y)(new_x) if m == 'pchip' else interp1d(x, y, fill_value = 'extrapolate')(new_x)
+    np.testing.assert_allclose(interp_single(x, y, new_x, m = m), expected, rtol = 1e-12)
+    outside = (new_x < x[0]) | (new_x > x[-1])
+    expected[outside] = np.nan
+    np.testing.assert_allclose(interp_single(x, y, new_x, m = m, extrapolate = False), expected, rtol = 1e-12)
+
+def test_sc_linear_bounds():
+    new_x = rng.uniform(x[0] - 2000, x[-1] + 2000, 5000)
+    np.testing.assert_allclose(interp_single(x, y, new_x, m = 'sc_linear'), interp1d(x, y, bounds_error = False)(new_x), rtol = 1e-12)
+
+def test_short_series():
+    assert np.isnan(interp_single([1.0], [2.0], np.linspace(0, 2, 5))).all()
+    assert np.isnan(interp_single([], [], np.linspace(0, 2, 5))).all()
+    # two points: pchip is the line through them
+    np.testing.assert_allclose(interp_single([0.0, 2.0], [1.0, 3.0], [0.5, 1.0, 3.0]), [1.5, 2.0, 4.0])
+
+@pytest.mark.parametrize('extrapolate', [False, True])
+def test_sc_interp1d_nan(extrapolate):
+    # nan holes inside and at both ends, as RR with removed ectopic beats
+    rr = y.copy(); rr[[0, 1, 20, 21, 22, 40, 79]] = np.nan
+    valid = ~np.isnan(rr); i = np.arange(len(rr))
+    expected = PchipInterpolator(i[valid], rr[valid], extrapolate = extrapolate)(i)
+    np.testing.assert_allclose(sc_interp1d_nan(rr, extrapolate = extrapolate), expected, rtol = 1e-12)
+    np.testing.assert_allclose(sc_interp1d_nan(rr, m = 'linear'), interp1d(i[valid], rr[valid], bounds_error = False)(i), rtol = 1e-12)
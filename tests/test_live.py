@@ -0,0 +1,60 @@
+import asyncio
+import datetime
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from qskit.live import HrvHub, replay_file, hrv_dataframe, load_recording
+from qskit.hrv import hrv_process
+
+# live hub: file replay against offline hrv_process, device queue backpressure and slow subscribers
+
+polar_rr = os.path.join(os.path.dirname(__file__), '..', 'qskit', 'data', 'rr', 'PolarFlowExport_RR.CSV')
+dts = datetime.datetime(2024, 1, 1, 22, 0)
+
+@pytest.mark.parametrize('batch_windows', [7, 10])
+def test_replay_equals_offline(batch_windows):
+    async def replay():
+        hub = HrvHub(max_workers = 2, batch_windows = batch_windows)
+        subscriber = hub.subscribe()
+        await replay_file(hub, 'polar', polar_rr, 1000, type = 'RR', column = 'duration', speed = None, window = 30, slide = 10, metrics = ['time', 'freq'], dts = dts)
+        await hub.close()
+        return hrv_dataframe([hrv for device, hrv in [subscriber.get_nowait() for i in range(subscriber.qsize())]])
+    hrv = asyncio.run(replay())
+    hrv_offline = hrv_process(load_recording(polar_rr, 'duration'), sf = 1000, type = 'RR', window = 30, slide = 10, metrics = ['time', 'freq'], dts = dts).reset_index(drop = True)
+    assert len(hrv) > 100 and len(hrv) == len(hrv_offline)
+    pd.testing.assert_frame_equal(hrv[hrv_offline.columns].reset_index(drop = True), hrv_offline, check_dtype = False)
+
+def test_backpressure():
+    async def push():
+        # executor is never used: no window is ready while the consumer is blocked on the first queue value
+        hub = HrvHub(executor = ThreadPoolExecutor(1))
+        hub.add_device('ecg', type = 'ECG', sf = 100, queue_size = 2)
+        stream = hub.streams['ecg']
+        # block the consumer task so that the device queue fills up
+        stream.task.cancel()
+        await asyncio.gather(stream.task, return_exceptions = True)
+        await hub.push('ecg', np.zeros(10)); await hub.push('ecg', np.zeros(10))
+        assert stream.queue.full()
+        pushed = asyncio.create_task(hub.push('ecg', np.zeros(10)))
+        await asyncio.sleep(0.05)
+        # producer waits while the queue is full, until a value is taken
+        assert not pushed.done()
+        stream.queue.get_nowait()
+        await asyncio.wait_for(pushed, 1)
+        assert stream.queue.qsize() == 2
+        hub.executor.shutdown()
+    asyncio.run(push())
+
+def test_slow_subscriber_drops_oldest():
+    async def publish():
+        hub = HrvHub(executor = ThreadPoolExecutor(1), subscriber_queue_size = 3)
+        slow = hub.subscribe(); other = hub.subscribe(devices = ['other'])
+        for i in range(5):
+            hub.publish('polar', {'ss': i})
+        # publishing never blocks, slow subscriber keeps the newest windows
+        assert [slow.get_nowait()[1]['ss'] for i in range(slow.qsize())] == [2, 3, 4]
+        assert other.empty()
+        hub.executor.shutdown()
+    asyncio.run(publish())
@@ -0,0 +1,37 @@
+import importlib
+import numpy as np
+import pytest
+from qskit.hrv import hrv_segment, hrv_process
+from qskit.hrv.lomb import hrv_lomb
+
+# Lomb-Scargle psd_method: power scaling on sinusoidal RR and no RR interpolation for freq & pwr metrics
+
+def sinusoid_rpeaks(amplitude = 50, f = 0.25, rr_mean = 1000, duration = 300):
+    # beat times (ms) of RR modulated by a sinusoid of amplitude (ms) at f (Hz)
+    rpeaks = [0.0]
+    while rpeaks[-1] < duration * 1000:
+        rpeaks.append(rpeaks[-1] + rr_mean + amplitude * np.sin(2 * np.pi * f * rpeaks[-1] / 1000))
+    return np.array(rpeaks)
+
+@pytest.mark.parametrize('window', [60, 300])
+def test_lomb_power_scaling(window):
+    # power of sinusoid is A^2 / 2, all in HF band with peak at its frequency
+    hrv = hrv_lomb([sinusoid_rpeaks(duration = window)], 1000, window = window)[0]
+    np.testing.assert_allclose(hrv['hf'], 50 ** 2 / 2, rtol = 0.1)
+    assert hrv['lf'] < 0.01 * hrv['hf']
+    assert hrv['hfn'] > 0.95
+    assert abs(hrv['ex_hf_peak_freq'] - 0.25) <= 1 / (4 * window)
+
+def test_lomb_without_interpolation(monkeypatch):
+    def sc_interp1d(*args, **kwargs):
+        raise AssertionError('RR interpolated')
+    monkeypatch.setattr(importlib.import_module('qskit.hrv.hrv_segment'), 'sc_interp1d', sc_interp1d)
+    hrv = hrv_segment(sinusoid_rpeaks(duration = 60), 1000, window = 60, metrics = ['freq', 'pwr'], psd_method = 'lomb')
+    np.testing.assert_allclose(hrv['hf_60s'], 50 ** 2 / 2, rtol = 0.1)
+    with pytest.raises(AssertionError):
+        hrv_segment(sinusoid_rpeaks(duration = 60), 1000, window = 60, metrics = ['time', 'freq'], psd_method = 'lomb')
+
+def test_psd_method_validated():
+    with pytest.raises(ValueError):
+        hrv_segment(sinusoid_rpeaks(duration = 60), 1000, window = 60, metrics = ['freq'], psd_method = 'fft')
+    assert hrv_process(np.diff(sinusoid_rpeaks()), sf = 1000, type = 'RR', metrics = ['freq'], psd_method = 'fft') is None
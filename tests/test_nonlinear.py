@@ -0,0 +1,28 @@
+import numpy as np
+import neurokit2 as nk
+import pytest
+from qskit.hrv.nonlinear import entropy_sample, entropy_approximate, entropy_multiscale, entropy_tolerance, hrv_entropy
+
+# kd-tree entropies against neurokit on short, constant, tied (integer valued) and random RR series
+
+rng = np.random.default_rng(3)
+series = {'short': 800 + 50 * rng.standard_normal(12), 'constant': np.full(50, 800.0),
+          'tied': rng.integers(790, 800, 200).astype(np.float64), 'random': 800 + 50 * rng.standard_normal(300)}
+
+@pytest.mark.parametrize('name', list(series))
+def test_entropy_neurokit(name):
+    rr = series[name]
+    tolerance = entropy_tolerance(rr)
+    np.testing.assert_allclose(entropy_sample(rr, 2, tolerance), nk.entropy_sample(rr, dimension = 2, tolerance = tolerance)[0])
+    np.testing.assert_allclose(entropy_approximate(rr, 2, tolerance), nk.entropy_approximate(rr, dimension = 2, tolerance = tolerance)[0])
+    np.testing.assert_allclose(entropy_multiscale(rr, dimension = 2, tolerance = tolerance)[0], nk.entropy_multiscale(rr, dimension = 2, tolerance = tolerance)[0])
+
+def test_entropy_shared_matches():
+    # pairs only (without apen) and per template counts give the same sampen & mse, array tolerance as scalar ones
+    rr = series['random']
+    hrv_e = hrv_entropy(rr)
+    for m in ['sampen', 'mse']:
+        assert hrv_entropy(rr, [m])[m] == pytest.approx(hrv_e[m])
+    tolerance = entropy_tolerance(rr) * np.array([0.5, 1, 2])
+    np.testing.assert_allclose(entropy_sample(rr, 2, tolerance), [entropy_sample(rr, 2, t) for t in tolerance])
+    np.testing.assert_allclose(entropy_approximate(rr, 2, tolerance), [entropy_approximate(rr, 2, t) for t in tolerance])
@@ -0,0 +1,21 @@
+import numpy as np
+import neurokit2 as nk
+import pytest
+from vital_sqi.common.rpeak_detection import PeakDetector
+from qskit.signal import ppg_findpeaks, butter_bandpass_filter
+
+# whole signal PPG peak & trough detection against vital_sqi PeakDetector (detector_type = 1) on simulated PPG
+
+@pytest.mark.parametrize('sf', [64, 100, 256])
+def test_ppg_findpeaks_vital_sqi(sf):
+    ppg = nk.ppg_simulate(duration = 300, sampling_rate = sf, heart_rate = 65, random_state = 2)
+    ppg_clean = butter_bandpass_filter(ppg, .4, 4, sf, 4)
+    peaks_vs, troughs_vs = PeakDetector(wave_type = 'ppg', fs = sf).ppg_detector(ppg_clean, detector_type = 1)
+    # chunks of 60 s, so that ROIs and troughs crossing chunk borders are covered
+    peaks, troughs = ppg_findpeaks(ppg_clean, sf, chunk = 60)
+    assert len(peaks) > 300
+    np.testing.assert_array_equal(peaks, peaks_vs)
+    np.testing.assert_array_equal(troughs, troughs_vs)
+    peaks_only, no_troughs = ppg_findpeaks(ppg_clean, sf, chunk = 60, troughs = False)
+    np.testing.assert_array_equal(peaks_only, peaks_vs)
+    assert no_troughs is None
@@ -0,0 +1,52 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from qskit.hrv import hrv_store_add, hrv_store_query, hrv_store_rollup, hrv_rollup
+
+# result store: incremental rollups against full recompute, nights across midnight, quality filter
+
+def hrv_windows(start, hours, seed = 0):
+    # hrv_process like windows of 60 s every 30 s
+    rng = np.random.default_rng(seed)
+    dt = pd.date_range(start, periods = int(hours * 120), freq = '30s')
+    return pd.DataFrame({'hr_60s': rng.uniform(50, 80, len(dt)), 'rmssd_60s': rng.uniform(20, 80, len(dt)),
+                         'ss': np.arange(len(dt)) * 30 * 512, 'dt': dt, 'q': rng.uniform(size = len(dt)) > 0.3})
+
+def test_rollups_incremental(tmp_path):
+    # overlapping recordings over two nights, added out of order, one of them twice
+    recordings = [hrv_windows('2024-01-01 18:00', 10, 1), hrv_windows('2024-01-02 03:00', 8, 2),
+                  hrv_windows('2024-01-02 21:30', 12, 3), hrv_windows('2024-01-01 23:00', 3, 4)]
+    for hrv in recordings + [recordings[1]]:
+        hrv_store_add(tmp_path, hrv, device = 'polar')
+    # windows with same dt are replaced by the last added recording
+    hrv_all = pd.concat(recordings + [recordings[1]]).drop_duplicates(subset = ['dt'], keep = 'last').sort_values('dt').reset_index(drop = True)
+    stored = hrv_store_query(tmp_path, device = 'polar', window = 60)
+    assert len(stored) == len(hrv_all)
+    pd.testing.assert_frame_equal(stored[hrv_all.columns], hrv_all, check_dtype = False)
+    for freq in ['hourly', 'nightly']:
+        rollup = hrv_store_rollup(tmp_path, device = 'polar', window = 60, freq = freq)
+        expected = hrv_rollup(hrv_all, 60, freq)
+        pd.testing.assert_frame_equal(rollup, expected, check_dtype = False)
+
+def test_nights_across_midnight(tmp_path):
+    hrv_store_add(tmp_path, hrv_windows('2024-01-01 12:00', 48))
+    nightly = hrv_store_rollup(tmp_path, window = 60, freq = 'nightly')
+    # nights are keyed by evening date, windows of 20:00 - 08:00 only
+    assert nightly['dt'].tolist() == [pd.Timestamp('2024-01-01'), pd.Timestamp('2024-01-02')]
+    assert nightly['windows'].tolist() == [12 * 120, 12 * 120]
+    night = hrv_store_query(tmp_path, window = 60, start = datetime.datetime(2024, 1, 1, 20), end = datetime.datetime(2024, 1, 2, 8))
+    assert night['rmssd_60s'][night['q']].median() == pytest.approx(nightly['rmssd_60s_median'][0])
+
+def test_query_quality(tmp_path):
+    hrv = hrv_windows('2024-01-01 22:00', 4)
+    hrv_store_add(tmp_path, hrv)
+    good = hrv_store_query(tmp_path, window = 60, start = datetime.datetime(2024, 1, 1, 23), end = datetime.datetime(2024, 1, 2, 1), quality = True, columns = ['rmssd_60s'])
+    expected = hrv[hrv['q'] & (hrv['dt'] >= '2024-01-01 23:00') & (hrv['dt'] < '2024-01-02 01:00')]
+    assert list(good.columns) == ['dt', 'rmssd_60s']
+    np.testing.assert_allclose(good['rmssd_60s'], expected['rmssd_60s'])
+    assert hrv_store_rollup(tmp_path, window = 60, freq = 'hourly')['windows_q'].sum() == hrv['q'].sum()
+
+def test_window_required(tmp_path):
+    with pytest.raises(ValueError):
+        hrv_store_add(tmp_path, hrv_windows('2024-01-01 22:00', 1).rename(columns = {'hr_60s': 'hr'}))